@@ -0,0 +1,60 @@
+"""
+Attendance balance engine benchmark on synthetic multi-year data.
+
+    python -m benchmarks.attendance [--years 5] [--runs 5]
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from odoohelper.attendance import compute_balance
+
+
+def synthetic_data(years):
+    """ Two attendances per working day and a leave every month """
+    random.seed(1)
+    start = datetime(2010, 1, 1)
+    end = start + timedelta(days=365 * years)
+    attendances = []
+    leaves = []
+    day = start
+    while day < end:
+        if day.weekday() < 5:
+            for hour, length in ((8, 4), (12, 4)):
+                check_in = day + timedelta(hours=hour, minutes=random.randint(0, 30))
+                attendances.append({
+                    'check_in': check_in.strftime('%Y-%m-%d %H:%M:%S'),
+                    'check_out': (check_in + timedelta(hours=length)).strftime('%Y-%m-%d %H:%M:%S'),
+                    'worked_hours': length - random.random(),
+                })
+        if day.day == 15:
+            leaves.append({
+                'name': 'Leave',
+                'date_from': day.strftime('%Y-%m-%d 06:00:00'),
+                'date_to': (day + timedelta(days=2)).strftime('%Y-%m-%d 16:00:00'),
+                'holiday_status_id': [random.choice((1, 2, 3)), 'Leave'],
+            })
+        day += timedelta(days=1)
+    return attendances, leaves, start, end
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    attendances, leaves, start, end = synthetic_data(args.years)
+    times = []
+    for _ in range(args.runs):
+        begin = time.perf_counter()
+        compute_balance(attendances, leaves, start, end, local_holidays={})
+        times.append((time.perf_counter() - begin) * 1000)
+    print(f'{len(attendances)} attendances, {len(leaves)} leaves over {args.years} years')
+    print(f'compute_balance median {statistics.median(times):.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+End to end command benchmark against the local mock Odoo server.
+
+Runs tasks, search, project and attendance commands in process and
+reports RPC count of first (cold cache) and later runs, request and
+response bytes, RPC latency percentiles and wall time per command. Exits
+with status 1 if a later run makes more RPCs than command budget.
+
+    python -m benchmarks.e2e [--runs 5] [--latency 0.02] [--tasks 2000]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from benchmarks.mock_server import DATABASE, PASSWORD, MockOdoo, generate
+from odoohelper.odoohelper import cli
+
+# Command line and max RPCs per warm run. First run fills local caches.
+SCENARIOS = [
+    ('tasks', ['tasks'], 4),
+    ('tasks -n 20', ['tasks', '-n', '20'], 30),
+    ('tasks --user', ['tasks', '-u', 'User 3'], 4),
+    ('search', ['search', 'Task 1'], 4),
+    ('project', ['project', '-p', '1'], 12),
+    ('project --summary', ['project', '-s', '1'], 12),
+    ('attendance', ['attendance'], 4),
+    ('attendance team', ['attendance', '-d', 'Development'], 6),
+]
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def configure(directory, port, login='user1'):
+    """ Point config, session and cache files to directory """
+    config = os.path.join(directory, 'config.json')
+    with open(config, 'w') as f:
+        json.dump({
+            'username': login,
+            'host': '127.0.0.1',
+            'port': port,
+            'protocol': 'json-rpc',
+            'database': DATABASE,
+        }, f)
+    return {
+        'ODOO_CONFIG': config,
+        'ODOO_SESSION': os.path.join(directory, 'session.json'),
+        'ODOO_CACHE': os.path.join(directory, 'cache.sqlite'),
+    }
+
+
+def run(mock, args):
+    """ Run command once. Returns (result, calls, seconds). """
+    mock.reset()
+    start = time.perf_counter()
+    result = CliRunner().invoke(cli, args + ['--password', PASSWORD], input='\n')
+    seconds = time.perf_counter() - start
+    return result, mock.reset(), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds added to each request')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--tasks', type=int, default=2000)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory, \
+            MockOdoo(generate(args.users, args.projects, args.tasks), args.latency) as mock, \
+            patch.dict(os.environ, configure(directory, mock.port)):
+        print(f'{args.tasks} tasks, {args.latency * 1000:.0f} ms latency, {args.runs} runs\n')
+        print(f'{"command":20}{"cold":>6}{"warm":>6}{"sent KB":>9}{"recv KB":>9}'
+              f'{"rpc p50":>9}{"rpc p95":>9}{"rpc p99":>9}{"wall p50":>10}{"wall p95":>10}')
+        for name, command, budget in SCENARIOS:
+            rpcs, walls, latencies, sent, received = [], [], [], [], []
+            for _ in range(args.runs):
+                result, calls, seconds = run(mock, command)
+                if result.exit_code != 0:
+                    print(f'{name}: exit {result.exit_code}\n{result.output}', file=sys.stderr)
+                    raise SystemExit(2)
+                rpcs.append(len(calls))
+                walls.append(seconds * 1000)
+                latencies += [call.seconds * 1000 for call in calls]
+                sent.append(sum(call.request_bytes for call in calls) / 1024)
+                received.append(sum(call.response_bytes for call in calls) / 1024)
+            warm = max(rpcs[1:] or rpcs)
+            status = 'ok' if warm <= budget else f'OVER BUDGET {budget}'
+            failed = failed or warm > budget
+            print(f'{name:20}{rpcs[0]:6}{warm:6}{statistics.median(sent):9.1f}{statistics.median(received):9.1f}'
+                  f'{percentile(latencies, 50):9.1f}{percentile(latencies, 95):9.1f}{percentile(latencies, 99):9.1f}'
+                  f'{percentile(walls, 50):10.1f}{percentile(walls, 95):10.1f}  {status}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
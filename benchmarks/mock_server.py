@@ -0,0 +1,429 @@
+"""
+Local stand-in for Odoo JSON-RPC used by benchmarks and end to end tests.
+
+Models project.task, mail.message, project.project, res.users,
+hr.employee, hr.attendance and hr.holidays with generated records, and
+the start_tracking/terminate_tracking task methods. Every request is
+recorded with its size and duration.
+
+    python -m benchmarks.mock_server [--port 8069] [--latency 0.05] [--tasks 2000]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SERVER_VERSION = '11.0'
+PASSWORD = 'password'
+DATABASE = 'bench'
+
+# Done, inbox, in progress and ordered stages
+STAGES = {8: 'Tehty', 14: 'Inbox', 7: 'Työn alla', 6: 'Tilattu'}
+
+Call = namedtuple('Call', ['service', 'model', 'method', 'records', 'request_bytes', 'response_bytes', 'seconds'])
+
+# Many2one fields and the model they point to
+RELATIONS = {
+    'project.task': {'stage_id': 'project.task.type', 'user_id': 'res.users', 'project_id': 'project.project'},
+    'hr.employee': {'user_id': 'res.users', 'department_id': 'hr.department', 'current_task': 'project.task'},
+    'hr.attendance': {'employee_id': 'hr.employee'},
+    'hr.holidays': {'employee_id': 'hr.employee', 'holiday_status_id': 'hr.holidays.status'},
+    'mail.message': {},
+    'project.project': {'user_id': 'res.users'},
+    'res.users': {},
+    'project.task.type': {},
+    'hr.department': {},
+    'hr.holidays.status': {},
+}
+
+
+class OdooError(Exception):
+    """ Returned to client as JSON-RPC error """
+
+
+def timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate(users=20, projects=50, tasks=2000, messages=5, days=60, seed=1):
+    """
+    Return dataset as model -> {id: record}. Records are stored as
+    Odoo returns them from read, many2one values are [id, name].
+    """
+    rand = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    data = {model: {} for model in RELATIONS}
+    for stage_id, name in STAGES.items():
+        data['project.task.type'][stage_id] = {
+            'id': stage_id, 'name': name, 'display_name': name, 'write_date': timestamp(now)}
+    for department_id, name in ((1, 'Development'), (2, 'Sales')):
+        data['hr.department'][department_id] = {'id': department_id, 'name': name}
+    for status_id, name in ((1, 'Legal Leaves'), (2, 'Sick Leaves'), (3, 'Compensatory Days')):
+        data['hr.holidays.status'][status_id] = {'id': status_id, 'name': name}
+
+    for user_id in range(1, users + 1):
+        name = f'User {user_id}'
+        data['res.users'][user_id] = {
+            'id': user_id, 'name': name, 'display_name': name, 'login': f'user{user_id}', 'write_date': timestamp(now)}
+        data['hr.employee'][user_id] = {
+            'id': user_id,
+            'name': name,
+            'user_id': [user_id, name],
+            'department_id': [1, 'Development'] if user_id % 2 else [2, 'Sales'],
+            'current_task': False,
+        }
+
+    for project_id in range(1, projects + 1):
+        name = f'Project {project_id}'
+        data['project.project'][project_id] = {
+            'id': project_id,
+            'name': name,
+            'display_name': name,
+            'description': f'Description of {name}',
+            'is_subtask_project': False,
+            'user_id': [1, 'User 1'],
+            'task_count': 0,
+            'tasks': [],
+            'write_date': timestamp(now - timedelta(days=30)),
+        }
+
+    message_id = 0
+    for task_id in range(1, tasks + 1):
+        user_id = rand.randint(1, users)
+        project_id = rand.randint(1, projects)
+        stage_id = rand.choice(list(STAGES))
+        project = data['project.project'][project_id]
+        project['task_count'] += 1
+        project['tasks'].append(task_id)
+        created = now - timedelta(days=rand.randint(1, 300))
+        message_ids = []
+        for _ in range(rand.randint(0, messages * 2)):
+            message_id += 1
+            message_ids.append(message_id)
+            data['mail.message'][message_id] = {
+                'id': message_id,
+                'date': timestamp(min(now, created + timedelta(hours=rand.randint(0, 24 * 200)))),
+                'model': 'project.task',
+                'res_id': task_id,
+                'body': '<p>' + 'Message text. ' * rand.randint(5, 50) + '</p>',
+            }
+        deadline = rand.choice((False, (now + timedelta(days=rand.randint(-30, 60))).strftime('%Y-%m-%d')))
+        data['project.task'][task_id] = {
+            'id': task_id,
+            'name': f'Task {task_id}',
+            'description': '<p>' + 'Task description. ' * rand.randint(10, 200) + '</p>',
+            'stage_id': [stage_id, STAGES[stage_id]],
+            'user_id': [user_id, f'User {user_id}'],
+            'project_id': [project_id, project['name']],
+            'full_project_name': project['name'],
+            'date_deadline': deadline,
+            'create_date': timestamp(created),
+            'date_start': rand.choice((False, timestamp(created))),
+            'date_end': rand.choice((False, f'{deadline} 22:00:00' if deadline else False)),
+            'message_ids': message_ids,
+            'kanban_state': rand.choice(('normal', 'normal', 'blocked', 'done')),
+            'planned_hours': rand.choice((0, 2, 8)),
+            'priority': rand.choice(('0', '0', '1')),
+            'write_date': timestamp(created + timedelta(days=rand.randint(0, 30))),
+        }
+
+    attendance_id = 0
+    holiday_id = 0
+    today = now.replace(hour=0, minute=0, second=0)
+    for user_id in data['hr.employee']:
+        employee = [user_id, f'User {user_id}']
+        for day in range(days, -1, -1):
+            date = today - timedelta(days=day)
+            if date.weekday() > 4:
+                continue
+            check_in = date + timedelta(hours=rand.randint(6, 9), minutes=rand.randint(0, 59))
+            worked = round(rand.uniform(6, 9), 2)
+            attendance_id += 1
+            data['hr.attendance'][attendance_id] = {
+                'id': attendance_id,
+                'employee_id': employee,
+                'check_in': timestamp(check_in),
+                'check_out': False if day == 0 else timestamp(check_in + timedelta(hours=worked)),
+                'worked_hours': 0 if day == 0 else worked,
+                'write_date': timestamp(check_in),
+            }
+        holiday_id += 1
+        start = today - timedelta(days=rand.randint(1, days))
+        data['hr.holidays'][holiday_id] = {
+            'id': holiday_id,
+            'employee_id': employee,
+            'name': 'Leave',
+            'holiday_type': 'employee',
+            'date_from': timestamp(start),
+            'date_to': timestamp(start + timedelta(hours=8)),
+            'holiday_status_id': [rand.randint(1, 3), 'Leave type'],
+            'write_date': timestamp(start),
+        }
+    return data
+
+
+class MockOdoo():
+    """
+    In memory Odoo. handle() answers one JSON-RPC request body.
+    """
+
+    def __init__(self, data, latency=0.0):
+        self.data = data
+        self.latency = latency
+        self.calls = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
+
+    def start(self, port=0):
+        """ Serve in background thread. Returns port. """
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                response = mock.handle(body)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def reset(self):
+        """ Return recorded calls and start recording again """
+        with self.lock:
+            calls, self.calls = self.calls, []
+        return calls
+
+    def handle(self, body):
+        """ Answer JSON-RPC request body and record call """
+        start = time.perf_counter()
+        request = json.loads(body)
+        params = request['params']
+        model, method, records = None, params['method'], 0
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if params['service'] == 'object':
+                _, uid, password, model, method, args, kwargs = params['args']
+                self.check_user(uid, password)
+                with self.lock:
+                    result = self.execute(uid, model, method, *args, **(kwargs or {}))
+                records = len(result) if isinstance(result, list) else 1
+            else:
+                result = self.dispatch(params['service'], params['method'], params['args'])
+            response = {'jsonrpc': '2.0', 'id': request['id'], 'result': result}
+        except OdooError as error:
+            response = {
+                'jsonrpc': '2.0',
+                'id': request['id'],
+                'error': {'code': 200, 'message': 'Odoo Server Error', 'data': {'message': str(error)}},
+            }
+        response = json.dumps(response).encode('utf-8')
+        with self.lock:
+            self.calls.append(Call(
+                params['service'], model, method, records, len(body), len(response),
+                time.perf_counter() - start))
+        return response
+
+    def check_user(self, uid, password):
+        if uid not in self.data['res.users'] or password != PASSWORD:
+            raise OdooError('Access Denied')
+
+    def dispatch(self, service, method, args):
+        if service == 'common' and method == 'login':
+            database, login, password = args
+            for user in self.data['res.users'].values():
+                if user['login'] == login and password == PASSWORD and database == DATABASE:
+                    return user['id']
+            return False
+        if service == 'common' and method == 'version':
+            return {'server_version': SERVER_VERSION, 'server_serie': SERVER_VERSION}
+        if service == 'db' and method == 'server_version':
+            return SERVER_VERSION
+        raise OdooError(f'Unknown method {service}.{method}')
+
+    def records(self, model):
+        if model not in self.data:
+            raise OdooError(f'Object {model} doesn\'t exist')
+        return self.data[model]
+
+    def execute(self, uid, model, method, *args, **kwargs):
+        records = self.records(model)
+        if method == 'search':
+            return [r['id'] for r in self.search(model, *args, **kwargs)]
+        if method == 'search_count':
+            return len(self.search(model, *args))
+        if method == 'search_read':
+            fields = kwargs.pop('fields', None)
+            if len(args) > 1:
+                fields = args[1]
+            return [self.project(model, r, fields) for r in self.search(model, *args[:1], **kwargs)]
+        if method == 'read':
+            ids = args[0] if isinstance(args[0], list) else [args[0]]
+            fields = args[1] if len(args) > 1 else kwargs.get('fields')
+            result = [self.project(model, records[i], fields) for i in ids if i in records]
+            return result if isinstance(args[0], list) else result[0]
+        if method == 'write':
+            ids = args[0] if isinstance(args[0], list) else [args[0]]
+            for record_id in ids:
+                self.write(model, records[record_id], args[1])
+            return True
+        if method == 'create':
+            record_id = max(records, default=0) + 1
+            records[record_id] = {'id': record_id}
+            self.write(model, records[record_id], args[0])
+            return record_id
+        if method == 'fields_get':
+            return {name: {'type': 'char'} for name in next(iter(records.values()), {})}
+        if model == 'project.task' and method in ('start_tracking', 'terminate_tracking'):
+            task_id = args[0][0]
+            current = [task_id, records[task_id]['name']] if method == 'start_tracking' else False
+            self.data['hr.employee'][uid]['current_task'] = current
+            return True
+        raise OdooError(f'Unknown method {model}.{method}')
+
+    def write(self, model, record, vals):
+        for field, value in vals.items():
+            related = RELATIONS[model].get(field)
+            if related and isinstance(value, int) and not isinstance(value, bool):
+                value = [value, self.display_name(related, value)]
+            record[field] = value
+        record['write_date'] = timestamp(datetime.now())
+
+    def display_name(self, model, record_id):
+        record = self.records(model).get(record_id, {})
+        return record.get('display_name', record.get('name', ''))
+
+    def project(self, model, record, fields):
+        if not fields:
+            return dict(record)
+        result = {'id': record['id']}
+        for field in fields:
+            if field not in record:
+                raise OdooError(f'Invalid field {field} on model {model}')
+            result[field] = record[field]
+        return result
+
+    def search(self, model, domain=(), offset=0, limit=None, order=None, **kwargs):
+        found = [r for r in self.records(model).values() if self.matches(model, r, list(domain))]
+        for part in reversed((order or 'id').split(',')):
+            name, *direction = part.split()
+            found.sort(
+                key=lambda r: sort_key(r.get(name)),
+                reverse=bool(direction) and direction[0].lower() == 'desc')
+        found = found[offset:]
+        return found[:limit] if limit else found
+
+    def matches(self, model, record, domain):
+        """ Evaluate Odoo prefix notation domain """
+        stack = []
+        for term in reversed(domain):
+            if term == '!':
+                stack.append(not stack.pop())
+            elif term in ('&', '|'):
+                first, second = stack.pop(), stack.pop()
+                stack.append(first and second if term == '&' else first or second)
+            else:
+                stack.append(self.term(model, record, term))
+        # Terms without operator are joined with and
+        return all(stack)
+
+    def resolve(self, model, record, path):
+        """ Follow dotted path through many2one fields """
+        field, _, rest = path.partition('.')
+        value = record.get(field, False)
+        if not rest:
+            return value, RELATIONS[model].get(field)
+        if rest == 'id':
+            return (value[0] if value else False), None
+        related = RELATIONS[model].get(field)
+        if not value or related is None:
+            return False, None
+        return self.resolve(related, self.records(related)[value[0]], rest)
+
+    def term(self, model, record, term):
+        path, operator, expected = term
+        value, related = self.resolve(model, record, path)
+        if isinstance(value, list) and related:
+            # Many2one compares id, or name with like
+            value = value[1] if 'like' in operator else value[0]
+        if operator == '=':
+            return value == expected
+        if operator == '!=':
+            return value != expected
+        if operator in ('in', 'not in'):
+            found = bool(set(value) & set(expected)) if isinstance(value, list) else value in expected
+            return found if operator == 'in' else not found
+        if operator in ('ilike', 'like'):
+            return bool(value) and str(expected).lower() in str(value).lower()
+        if value is False:
+            return False
+        if operator == '<':
+            return value < expected
+        if operator == '<=':
+            return value <= expected
+        if operator == '>':
+            return value > expected
+        if operator == '>=':
+            return value >= expected
+        raise OdooError(f'Invalid operator {operator}')
+
+
+def sort_key(value):
+    # Empty values last like postgres
+    if isinstance(value, list):
+        value = value[0] if value else False
+    return (value is False or value is None, value if value not in (False, None) else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8069)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds added to each request')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--tasks', type=int, default=2000)
+    args = parser.parse_args()
+
+    mock = MockOdoo(generate(args.users, args.projects, args.tasks), args.latency)
+    mock.start(args.port)
+    print(f'Serving database {DATABASE} on 127.0.0.1:{args.port}, '
+          f'login user1 password {PASSWORD}, protocol json-rpc')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Priority scoring benchmark. Compares Task.calculate_priority per task
+with score_tasks over the same tasks, and Task.rank for full listing
+and with limit on empty and filled priority cache.
+
+    python -m benchmarks.priority [--tasks 100000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from odoohelper.cache import Cache
+from odoohelper.tasks import Task
+from odoohelper.tasks.priority import score_tasks
+
+
+def synthetic_data(count):
+    random.seed(1)
+    tasks_data = []
+    for task_id in range(count):
+        tasks_data.append({
+            'id': task_id,
+            'name': f'Task {task_id}',
+            'stage_id': [7, 'Työn alla'],
+            'date_deadline': random.choice((False, f'2018-{random.randint(1, 12):02}-15')),
+            'date_start': random.choice((False, '2018-01-02 08:00:00')),
+            'date_end': random.choice((False, '2018-12-30 16:00:00')),
+            'partial_messages': [{'date': '2018-06-21 12:00:00'}],
+            'kanban_state': random.choice(('normal', 'blocked')),
+            'planned_hours': random.choice((0, 4)),
+            'priority': random.choice(('0', '1')),
+        })
+    return tasks_data
+
+
+def synthetic_tasks(count):
+    tasks = []
+    for task_data in synthetic_data(count):
+        task = Task()
+        task.setup(task_data, score=False)
+        tasks.append(task)
+    return tasks
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=100000)
+    args = parser.parse_args()
+
+    tasks = synthetic_tasks(args.tasks)
+    start = time.perf_counter()
+    for task in tasks:
+        task.calculate_priority()
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    score_tasks(tasks)
+    batch = time.perf_counter() - start
+
+    print(f'{args.tasks} tasks')
+    print(f'calculate_priority {single * 1000:8.1f} ms')
+    print(f'score_tasks        {batch * 1000:8.1f} ms  ({single / batch:.1f}x)')
+
+    tasks_data = synthetic_data(args.tasks)
+    with tempfile.TemporaryDirectory() as directory, Cache(os.path.join(directory, 'cache.sqlite')) as cache:
+        print(f'rank               {timed(Task.rank, tasks_data, cache):8.1f} ms')
+        print(f'rank cold -n 20    {timed(Task.rank, tasks_data, cache, 20):8.1f} ms')
+        print(f'rank cached -n 20  {timed(Task.rank, tasks_data, cache, 20):8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
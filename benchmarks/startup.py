@@ -0,0 +1,57 @@
+"""
+Startup benchmark for the CLI.
+
+Measures wall time of `odoohelper --help` and import time of each
+command module in fresh interpreters. Exits with status 1 if any
+median is above its threshold.
+
+    python -m benchmarks.startup [--runs 5] [--help-ms 200] [--import-ms 150]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from odoohelper.odoohelper import LAZY_COMMANDS
+
+
+def median_ms(args, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--help-ms', type=float, default=200)
+    parser.add_argument('--import-ms', type=float, default=150)
+    args = parser.parse_args()
+
+    results = []
+    results.append((
+        'odoohelper --help',
+        median_ms([sys.executable, '-c', 'from odoohelper.odoohelper import main; main()', '--help'], args.runs),
+        args.help_ms,
+    ))
+    for module in sorted({source.split(':')[0] for source in LAZY_COMMANDS.values()}):
+        results.append((
+            f'import {module}',
+            median_ms([sys.executable, '-c', f'import {module}'], args.runs),
+            args.import_ms,
+        ))
+
+    failed = False
+    for name, value, threshold in results:
+        status = 'ok' if value <= threshold else 'SLOW'
+        failed = failed or value > threshold
+        print(f'{name:45}{value:8.1f} ms  (limit {threshold:.0f} ms)  {status}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
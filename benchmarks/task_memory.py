@@ -0,0 +1,92 @@
+"""
+Task memory benchmark. Compares 100k synthetic tasks stored as plain
+objects with __dict__ and full fields (old representation) with Task.
+
+    python -m benchmarks.task_memory [--tasks 100000]
+"""
+import argparse
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+from odoohelper.tasks import Task
+
+STAGES = [[6, 'Tilattu'], [7, 'Työn alla'], [14, 'Inbox']]
+USERS = [[i, f'User {i}'] for i in range(50)]
+PROJECTS = [[i, f'Project {i}'] for i in range(500)]
+
+
+class DictTask():
+    """ Old representation: every value kept as parsed from json """
+    def __init__(self, data):
+        self.id = data['id']
+        self.name = data['name']
+        self.stage = data['stage_id']
+        self.description = data['description']
+        self.user_id = data['user_id']
+        self.project_id = data['project_id']
+        self.project = data['full_project_name']
+        self.deadline = datetime.strptime(data['date_deadline'], '%Y-%m-%d') + timedelta(hours=12)
+        self.assigned = data['user_id']
+        self.create_date = datetime.strptime(data['create_date'], '%Y-%m-%d %H:%M:%S')
+        self.start_date = datetime.strptime(data['date_start'], '%Y-%m-%d %H:%M:%S')
+        self.end_date = datetime.strptime(data['date_end'], '%Y-%m-%d %H:%M:%S')
+        self.newest_message_date = max(
+            datetime.strptime(d['date'], '%Y-%m-%d %H:%M:%S') for d in data['partial_messages'])
+        self.blocked = data['kanban_state'] == 'blocked'
+        self.planned_hours = data['planned_hours']
+        self.marked_priority = data['priority'] == '1'
+        self.priority = 0
+
+
+def synthetic_task(task_id):
+    """ Raw task like server returns it. Lists are new objects per task like json. """
+    project = random.choice(PROJECTS)
+    return {
+        'id': task_id,
+        'name': f'Task number {task_id}',
+        'stage_id': list(random.choice(STAGES)),
+        'description': f'<p>Task {task_id}: ' + 'Lorem ipsum dolor sit amet. ' * 20 + '</p>',
+        'user_id': list(random.choice(USERS)),
+        'project_id': list(project),
+        'full_project_name': str(project[1]),
+        'date_deadline': '2018-10-31',
+        'create_date': '2018-10-01 08:00:00',
+        'date_start': '2018-10-02 08:00:00',
+        'date_end': '2018-10-30 16:00:00',
+        'partial_messages': [{'date': '2018-10-21 12:00:00'}],
+        'kanban_state': random.choice(('normal', 'blocked')),
+        'planned_hours': random.choice((0, 4, 8)),
+        'priority': random.choice(('0', '1')),
+    }
+
+
+def measure(factory, count):
+    random.seed(1)
+    tracemalloc.start()
+    tasks = [factory(synthetic_task(i)) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tasks
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=100000)
+    args = parser.parse_args()
+
+    def compact(data):
+        # Description is not part of task list reads
+        del data['description']
+        return Task(data)
+
+    before = measure(DictTask, args.tasks)
+    after = measure(compact, args.tasks)
+    print(f'{args.tasks} tasks')
+    print(f'before {before / 2 ** 20:8.1f} MiB  {before / args.tasks:6.0f} B/task')
+    print(f'after  {after / 2 ** 20:8.1f} MiB  {after / args.tasks:6.0f} B/task')
+
+
+if __name__ == '__main__':
+    main()
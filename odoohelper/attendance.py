@@ -0,0 +1,179 @@
+"""
+Attendance balance engine.
+
+Turns raw hr.attendance and hr.holidays records into per-day worked,
+allocated and difference values. Rendering is left to the CLI.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+
+# @TODO Assumes 7.5 hours per day
+ALLOCATED_HOURS = 7.5
+
+SICK_LEAVE = 2
+COMPENSATORY = 3
+
+Day = namedtuple(
+    "Day",
+    [
+        "date",
+        "worked_hours",
+        "allocated_hours",
+        "diff",
+        "overtime",
+        "sick_leave",
+        "compensatory",
+        "notes",
+    ],
+)
+
+Balance = namedtuple(
+    "Balance",
+    [
+        "days",
+        "total_hours",
+        "total_diff",
+        "day_diff",
+        "hours_today",
+        "allocated_today",
+    ],
+)
+
+
+def parse_timestamps(values):
+    """
+    Parse Odoo timestamps to datetimes. False values stay None.
+    """
+    parse = datetime.fromisoformat
+    return [parse(value) if value else None for value in values]
+
+
+def compute_balance(
+    attendances, leaves, start, end, now=None, utcnow=None, local_holidays=None
+):
+    """
+    Compute balance between start and end.
+
+    now is local time used to find today, utcnow is used to sum attendances
+    without checkout. local_holidays is a date -> name mapping, by default
+    Finnish holidays.
+    """
+    if now is None:
+        now = datetime.now()
+    if utcnow is None:
+        utcnow = datetime.utcnow()
+    if local_holidays is None:
+        import holidays
+
+        # @TODO Assumes user is in Finland
+        local_holidays = holidays.FI()
+
+    # Group worked hours by day ordinal
+    # @TODO This assumes the server returns times as EU/Helsinki
+    check_ins = parse_timestamps(a["check_in"] for a in attendances)
+    days = {}
+    for attendance, check_in in zip(attendances, check_ins):
+        worked_hours = attendance["worked_hours"]
+        if attendance["check_out"] == False:
+            # If there is no checkout time, sum to now
+            worked_hours = (utcnow - check_in).seconds / 3600
+        ordinal = check_in.toordinal()
+        day = days.get(ordinal)
+        if day is None:
+            day = days[ordinal] = {
+                "allocated_hours": ALLOCATED_HOURS,
+                "worked_hours": 0,
+                "overtime": False,
+                "sick_leave": False,
+                "compensatory": False,
+                "notes": None,
+            }
+        day["worked_hours"] += worked_hours
+
+    # Holidays and weekends inside requested period have no allocated hours
+    first = start.toordinal()
+    for ordinal in range(first, first + (end - start).days + 1):
+        day = days.get(ordinal)
+        if day is None:
+            # We don't care, no attendances for this day
+            continue
+        day_date = date.fromordinal(ordinal)
+        if day_date in local_holidays:
+            day["overtime"] = True
+            day["notes"] = local_holidays.get(day_date)
+            day["allocated_hours"] = 0
+        if day_date.weekday() > 4:
+            # Weekend, assume everything is overtime
+            day["overtime"] = True
+            day["notes"] = "Weekend"
+            day["allocated_hours"] = 0
+
+    # Process leaves
+    leave_starts = parse_timestamps(leave["date_from"] for leave in leaves)
+    leave_ends = parse_timestamps(leave["date_to"] for leave in leaves)
+    for leave, leave_start, leave_end in zip(leaves, leave_starts, leave_ends):
+        if leave_start > utcnow:
+            # We don't care about leaves into the future
+            continue
+        leave_status_id, _ = leave["holiday_status_id"]
+        first = leave_start.toordinal()
+        for ordinal in range(first, first + (leave_end - leave_start).days + 1):
+            day = days.get(ordinal)
+            if day is None:
+                continue
+            if leave_status_id == SICK_LEAVE:
+                day["sick_leave"] = True
+                day["notes"] = "Sick Leave"
+                day["allocated_hours"] = 0
+            elif leave_status_id == COMPENSATORY:
+                # Spent banked hours (full days)
+                day["compensatory"] = True
+                day["notes"] = f'Compensatory Day: {leave["name"]}'
+            else:
+                day["overtime"] = True
+                day["notes"] = f'Leave: {leave["name"]}'
+                day["allocated_hours"] = 0
+
+    # Totals
+    today = now.toordinal()
+    total_diff = 0
+    total_hours = 0
+    day_diff = 0
+    report = []
+    for ordinal in sorted(days):
+        day = days[ordinal]
+        # Skip if no hours worked and not a compensatory day
+        if day["worked_hours"] == 0.0 and not day["compensatory"]:
+            continue
+        report.append(
+            Day(
+                date=date.fromordinal(ordinal),
+                diff=day["worked_hours"] - day["allocated_hours"],
+                **day,
+            )
+        )
+        # Sick leave days are not counted
+        if day["sick_leave"]:
+            continue
+        # Compensatory days use banked hours so worked hours are zero
+        worked_hours = 0 if day["compensatory"] else day["worked_hours"]
+        if ordinal == today:
+            day_diff += worked_hours - day["allocated_hours"]
+        else:
+            total_diff += worked_hours - day["allocated_hours"]
+        total_hours += worked_hours
+
+    hours_today = 0
+    allocated_today = 0
+    if today in days:
+        hours_today = days[today]["worked_hours"]
+        allocated_today = days[today]["allocated_hours"]
+
+    return Balance(
+        days=report,
+        total_hours=total_hours,
+        total_diff=total_diff,
+        day_diff=day_diff,
+        hours_today=hours_today,
+        allocated_today=allocated_today,
+    )
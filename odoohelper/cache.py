@@ -0,0 +1,320 @@
+"""
+Local record cache stored in SQLite
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import click
+
+from odoohelper.settings import APP_NAME
+
+# How often cached ids are checked for deleted records (seconds)
+PRUNE_INTERVAL = 24 * 60 * 60
+
+# Sync key of task search index watermark
+INDEX_MODEL = 'project.task:index'
+
+
+def cache_file():
+    return os.environ.get(
+        'ODOO_CACHE',
+        os.path.join(click.get_app_dir(APP_NAME), 'cache.sqlite')
+    )
+
+
+class Cache():
+    """
+    Cache for Odoo records keyed by model and id.
+    Each model has a sync watermark which is the newest write_date seen.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or cache_file()
+        self.db = None
+        self.fts = False
+        # Connection is shared by Client.submit worker threads
+        self.lock = threading.RLock()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def open(self):
+        """ Open database and create tables if missing """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS records (
+                model TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                write_date TEXT,
+                data TEXT NOT NULL,
+                PRIMARY KEY (model, id)
+            );
+            CREATE TABLE IF NOT EXISTS sync (
+                model TEXT PRIMARY KEY,
+                watermark TEXT,
+                pruned REAL
+            );
+            CREATE TABLE IF NOT EXISTS refreshed (
+                model TEXT PRIMARY KEY,
+                time REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS priorities (
+                id INTEGER PRIMARY KEY,
+                priority INTEGER NOT NULL,
+                valid_until INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS priorities_order ON priorities (priority DESC, id);
+            CREATE TABLE IF NOT EXISTS operations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model TEXT NOT NULL,
+                method TEXT NOT NULL,
+                args TEXT NOT NULL,
+                write_dates TEXT NOT NULL,
+                created REAL NOT NULL,
+                conflict TEXT
+            );
+        ''')
+        try:
+            # rowid is task id
+            self.db.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS task_index USING fts5(
+                    name, description, messages, write_date UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+            ''')
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5, search uses server
+            self.fts = False
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def get(self, model, ids):
+        """ Return dict of cached records for ids """
+        found = {}
+        ids = list(ids)
+        with self.lock:
+            # Keep below SQLite host parameter limit
+            for index in range(0, len(ids), 500):
+                chunk = ids[index:index + 500]
+                rows = self.db.execute(
+                    f'SELECT id, data FROM records WHERE model = ? AND id IN ({",".join("?" * len(chunk))})',
+                    [model] + chunk)
+                for record_id, data in rows:
+                    found[record_id] = json.loads(data)
+        return found
+
+    def all(self, model):
+        """ Return dict of all cached records for model """
+        with self.lock:
+            rows = self.db.execute('SELECT id, data FROM records WHERE model = ?', (model,))
+            return {record_id: json.loads(data) for record_id, data in rows}
+
+    def ids(self, model):
+        """ Return all cached ids for model """
+        with self.lock:
+            rows = self.db.execute('SELECT id FROM records WHERE model = ?', (model,))
+            return {row[0] for row in rows}
+
+    def put(self, model, records):
+        """ Save records. Each record needs id and write_date """
+        with self.lock:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO records (model, id, write_date, data) VALUES (?, ?, ?, ?)',
+                [(model, r['id'], r.get('write_date'), json.dumps(r)) for r in records])
+            if model == 'project.task':
+                # Changed tasks are scored again
+                self.db.executemany('DELETE FROM priorities WHERE id = ?', [(r['id'],) for r in records])
+            newest = max((r['write_date'] for r in records if r.get('write_date')), default=None)
+            if newest and newest > (self.watermark(model) or ''):
+                self.set_watermark(model, newest)
+            self.db.commit()
+
+    def delete(self, model, ids):
+        with self.lock:
+            self.db.executemany(
+                'DELETE FROM records WHERE model = ? AND id = ?',
+                [(model, record_id) for record_id in ids])
+            if model == 'project.task':
+                self.db.executemany('DELETE FROM priorities WHERE id = ?', [(i,) for i in ids])
+            self.db.commit()
+            if model == 'project.task' and self.fts:
+                self.unindex_tasks(ids)
+
+    def priorities(self, ids, fingerprint, now):
+        """
+        Return dict of task id to cached priority, highest first. Only
+        priorities scored with fingerprint rules and valid after now
+        (microseconds) are returned.
+        """
+        ids = list(ids)
+        wanted = set(ids)
+        with self.lock:
+            if len(ids) > 500:
+                # Scan priority order index instead of many id lookups
+                rows = self.db.execute(
+                    'SELECT id, priority FROM priorities WHERE fingerprint = ? AND valid_until > ? '
+                    'ORDER BY priority DESC, id', (fingerprint, now))
+                return {task_id: priority for task_id, priority in rows if task_id in wanted}
+            rows = self.db.execute(
+                f'SELECT id, priority FROM priorities WHERE fingerprint = ? AND valid_until > ? '
+                f'AND id IN ({",".join("?" * len(ids))}) ORDER BY priority DESC, id',
+                [fingerprint, now] + ids)
+            return dict(rows.fetchall())
+
+    def set_priorities(self, rows, fingerprint):
+        """ Save (task id, priority, valid until) rows """
+        with self.lock:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO priorities (id, priority, valid_until, fingerprint) VALUES (?, ?, ?, ?)',
+                [(task_id, priority, until, fingerprint) for task_id, priority, until in rows])
+            self.db.commit()
+
+    def index_tasks(self, rows):
+        """ Add or replace (id, name, description, messages, write_date) rows in search index """
+        with self.lock:
+            self.db.executemany('DELETE FROM task_index WHERE rowid = ?', [(row[0],) for row in rows])
+            self.db.executemany(
+                'INSERT INTO task_index (rowid, name, description, messages, write_date) VALUES (?, ?, ?, ?, ?)',
+                rows)
+            self.db.commit()
+
+    def unindex_tasks(self, ids):
+        with self.lock:
+            self.db.executemany('DELETE FROM task_index WHERE rowid = ?', [(i,) for i in ids])
+            self.db.commit()
+
+    def indexed(self):
+        """ Return dict of indexed task id to write_date """
+        with self.lock:
+            return dict(self.db.execute('SELECT rowid, write_date FROM task_index'))
+
+    def clear_index(self):
+        with self.lock:
+            self.db.execute('DELETE FROM task_index')
+            self.db.execute('DELETE FROM sync WHERE model = ?', (INDEX_MODEL,))
+            self.db.commit()
+
+    def search_index(self, query, limit=50):
+        """
+        Return task ids matching all terms of query, best first. Each
+        term also matches as word prefix. Name matches weigh most.
+        """
+        terms = [term.replace('"', '""') for term in query.split()]
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"*' for term in terms)
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT rowid FROM task_index WHERE task_index MATCH ? '
+                'ORDER BY bm25(task_index, 10.0, 2.0, 1.0, 0.0) LIMIT ?',
+                (match, limit))
+            return [row[0] for row in rows]
+
+    def set_watermark(self, model, watermark):
+        with self.lock:
+            self.db.execute(
+                'INSERT INTO sync (model, watermark) VALUES (?, ?) '
+                'ON CONFLICT(model) DO UPDATE SET watermark = excluded.watermark',
+                (model, watermark))
+            self.db.commit()
+
+    def watermark(self, model):
+        """ Newest write_date seen for model or None """
+        with self.lock:
+            row = self.db.execute('SELECT watermark FROM sync WHERE model = ?', (model,)).fetchone()
+        return row[0] if row else None
+
+    def refreshed(self, model):
+        """ Time of last refresh of model or None """
+        with self.lock:
+            row = self.db.execute('SELECT time FROM refreshed WHERE model = ?', (model,)).fetchone()
+        return row[0] if row else None
+
+    def mark_refreshed(self, model):
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO refreshed (model, time) VALUES (?, ?)', (model, time.time()))
+            self.db.commit()
+
+    def needs_prune(self, model):
+        with self.lock:
+            row = self.db.execute('SELECT pruned FROM sync WHERE model = ?', (model,)).fetchone()
+        return not row or not row[0] or time.time() - row[0] > PRUNE_INTERVAL
+
+    def prune(self, model, client):
+        """ Remove cached records that no longer exist in server """
+        cached = self.ids(model)
+        if cached:
+            alive = set(client.search(model, [('id', 'in', list(cached))]))
+            self.delete(model, cached - alive)
+        with self.lock:
+            self.db.execute(
+                'INSERT INTO sync (model, pruned) VALUES (?, ?) '
+                'ON CONFLICT(model) DO UPDATE SET pruned = excluded.pruned',
+                (model, time.time()))
+            self.db.commit()
+
+
+def term_matches(record, term):
+    """ Evaluate one (field, operator, value) domain term on raw record """
+    field, operator, expected = term
+    value = record.get(field, False)
+    if isinstance(value, list) and len(value) == 2 and isinstance(value[0], int) and isinstance(value[1], str):
+        # Many2one compares id, or name with like
+        value = value[1] if 'like' in operator else value[0]
+    if operator == '=':
+        return value == expected
+    if operator == '!=':
+        return value != expected
+    if operator in ('in', 'not in'):
+        if isinstance(value, list):
+            found = bool(set(value) & set(expected))
+        else:
+            found = value in expected
+        return found if operator == 'in' else not found
+    if operator in ('ilike', 'like'):
+        return bool(value) and str(expected).lower() in str(value).lower()
+    if value is False or value is None:
+        return False
+    if operator == '<':
+        return value < expected
+    if operator == '<=':
+        return value <= expected
+    if operator == '>':
+        return value > expected
+    if operator == '>=':
+        return value >= expected
+    raise ValueError(f'Operator {operator} is not supported offline')
+
+
+def match_domain(record, domain):
+    """
+    Evaluate Odoo domain on raw cached record. Used when server is
+    not available. Dotted field paths are not supported.
+    """
+    stack = []
+    for term in reversed(domain):
+        if term == '!':
+            stack.append(not stack.pop())
+        elif term in ('&', '|'):
+            first, second = stack.pop(), stack.pop()
+            stack.append(first and second if term == '&' else first or second)
+        else:
+            stack.append(term_matches(record, term))
+    # Terms without operator are joined with and
+    return all(stack)
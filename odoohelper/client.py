@@ -1,8 +1,79 @@
 """
 Odoo client using Openerp proxy
 """
-# https://pypi.org/project/openerp_proxy/
-from openerp_proxy import Client as erpClient
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import click
+
+from odoohelper import trace
+from odoohelper.settings import APP_NAME
+
+# How long stored session is reused without fresh login (seconds)
+SESSION_TTL = 12 * 60 * 60
+
+# Max amount of concurrent requests to server
+MAX_CONNECTIONS = 4
+
+# Records per request in iter_search_read
+PAGE_SIZE = 200
+
+# Seconds to wait for server before it is handled as unreachable
+REQUEST_TIMEOUT = 30
+
+User = namedtuple('User', ['id', 'login'])
+
+# Set by global --offline option
+_offline = False
+
+
+def set_offline(value):
+    global _offline
+    _offline = value
+
+
+# Connected client used by all commands run in daemon
+_shared = None
+
+
+def set_shared(client):
+    global _shared
+    _shared = client
+
+
+def session_file():
+    return os.environ.get(
+        'ODOO_SESSION',
+        os.path.join(click.get_app_dir(APP_NAME), 'session.json')
+    )
+
+
+def is_access_denied(error):
+    """ Check if server rejected our session """
+    data = getattr(error, 'data', None) or {}
+    return 'AccessDenied' in str(data.get('name', '')) or 'Access Denied' in str(error)
+
+
+# Request errors after which server may have run the call
+UNANSWERED_ERRORS = ('Read timed out', 'Connection aborted')
+
+
+def is_unreachable(error):
+    """ Check if request got no answer from server """
+    return 'Cannot connect' in str(error)
+
+
+def is_unanswered(error):
+    """
+    Check if request may have reached server but its answer was lost.
+    Refused connections and failed name lookups never reach server.
+    """
+    return is_unreachable(error) and any(text in str(error) for text in UNANSWERED_ERRORS)
+
 
 class Client():
     """
@@ -22,58 +93,305 @@ class Client():
         self.protocol = protocol
         self.client = None  # Set this in connect or enter
         self.user = None
+        self.session_reused = False
+        # Concurrent calls rejected with same session login only once
+        self.login_lock = threading.Lock()
+        self.logins = 0
+        self.executor = None  # Created on first submit
+        # Writes go to operation log when offline or server is unreachable
+        self.offline = _offline or bool(os.environ.get('ODOO_OFFLINE'))
+        self.log = None  # Opened on first queued operation
+        self.replayed = None  # Result of replay in connect
+        # Report payload bytes saved by field projection
+        self.debug_fields = bool(os.environ.get('ODOO_DEBUG_FIELDS'))
+
+    @classmethod
+    def from_config(cls, config, password):
+        """
+        Client for settings. Port and protocol are optional in config
+        and default to Odoo online. In daemon the shared client is returned.
+        """
+        if _shared is not None:
+            return _shared
+        return cls(
+            username=config['username'],
+            password=password,
+            database=config['database'],
+            host=config['host'],
+            port=config.get('port', 443),
+            protocol=config.get('protocol', 'json-rpcs'))
+
+    @property
+    def session_key(self):
+        return f'{self.username}@{self.host}:{self.port}/{self.database}'
 
     def connect(self):
         """
-        Connect to Odoo
+        Connect to Odoo. Stored session is reused if it is still valid.
+        Offline any stored session is used and nothing is sent. If login
+        can not reach server client goes offline with expired session.
+        Operations queued while offline are replayed when online.
+        Connected client is not connected again.
         """
+        if self.client is not None:
+            return
+        # https://pypi.org/project/openerp_proxy/
+        from openerp_proxy import Client as erpClient
         self.client = erpClient(
             host=self.host,
             dbname=self.database,
             user=self.username,
             pwd=self.password,
             protocol=self.protocol,
-            port=self.port)
-        # Check connection by fetching user name
-        self.user = self.client.user
+            port=self.port,
+            timeout=REQUEST_TIMEOUT)
+        uid = self.load_session(expired=self.offline)
+        if self.offline:
+            if not uid:
+                raise ValueError('Offline mode needs a stored session, connect once online')
+            self.user = User(uid, self.username)
+            return
+        if uid:
+            # Skip authenticate handshake. Server checks this on first call.
+            self.client._uid = uid
+            self.session_reused = True
+            self.user = User(uid, self.username)
+        else:
+            from openerp_proxy.exceptions import ConnectorError
+            try:
+                self.login()
+            except ConnectorError as error:
+                uid = self.load_session(expired=True)
+                if not is_unreachable(error) or not uid:
+                    raise
+                self.offline = True
+                self.user = User(uid, self.username)
+                return
+        from odoohelper.cache import cache_file
+        if os.path.exists(cache_file()):
+            # Nothing can be queued before cache exists
+            self.replay()
 
+    def operation_log(self):
+        """ Operation log in local cache, opened on first use """
+        if self.log is None:
+            from odoohelper.cache import Cache
+            from odoohelper.oplog import OperationLog
+            self.log = OperationLog(Cache().__enter__())
+        return self.log
+
+    def replay(self, force=False):
+        """
+        Send operations queued while offline. If server is not reachable
+        client goes offline and operations stay queued. Operations server
+        rejects stay in log as failed, see sync.
+        """
+        from openerp_proxy.exceptions import ConnectorError
+        log = self.operation_log()
+        if not log.count():
+            return None
+        try:
+            self.replayed = log.replay(self, force)
+        except ConnectorError as error:
+            if not is_unreachable(error):
+                raise
+            self.offline = True
+        return self.replayed
+
+    def login(self):
+        """
+        Authenticate and store session for next runs
+        """
+        self.session_reused = False
+        self.logins += 1
+        self.client._uid = None
+        uid = self.client.uid
+        self.user = User(uid, self.username)
+        self.save_session(uid)
+
+    def load_session(self, expired=False):
+        """ Return stored uid or None if there is no valid session """
+        try:
+            with open(session_file(), 'r') as f:
+                session = json.load(f).get(self.session_key)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not session or (not expired and time.time() - session['created'] > SESSION_TTL):
+            return None
+        return session['uid']
+
+    def save_session(self, uid):
+        try:
+            with open(session_file(), 'r') as f:
+                sessions = json.load(f)
+        except (FileNotFoundError, ValueError):
+            sessions = {}
+        sessions[self.session_key] = {'uid': uid, 'created': time.time()}
+        os.makedirs(os.path.dirname(os.path.abspath(session_file())), exist_ok=True)
+        with open(session_file(), 'w') as f:
+            json.dump(sessions, f)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Run RPC function. If server rejects reused session login again and retry.
+        """
+        from openerp_proxy.exceptions import ConnectorError
+        reused, logins = self.session_reused, self.logins
+        try:
+            return func(*args, **kwargs)
+        except ConnectorError as error:
+            if not reused or not is_access_denied(error):
+                raise
+            with self.login_lock:
+                if self.logins == logins:
+                    self.login()
+            return func(*args, **kwargs)
+
+    def rpc(self, model, method, func, *args, **kwargs):
+        """
+        Run func with call and record it to active tracer
+        """
+        tracer = trace.active()
+        if tracer is None:
+            return self.call(func, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = self.call(func, *args, **kwargs)
+        except Exception as error:
+            tracer.record(model, method, args, kwargs, None, time.perf_counter() - start, str(error))
+            raise
+        tracer.record(model, method, args, kwargs, result, time.perf_counter() - start)
+        return result
 
     def __enter__(self):
         self.connect()
         return self
 
     def __exit__(self, type, value, traceback):
-        pass
+        self.close()
+
+    def close(self):
+        """ Stop worker threads of submit and close operation log """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.log is not None:
+            self.log.cache.close()
+            self.log = None
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) in background and return a Future.
+        Use this for independent calls so they can run concurrently
+        with at most MAX_CONNECTIONS requests in flight.
+        """
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS)
+        return self.executor.submit(func, *args, **kwargs)
+
+    @staticmethod
+    def gather(*futures):
+        """ Wait for futures and return their results in order """
+        return [future.result() for future in futures]
 
     def search(self, db_name, filters):
         """
         Search ids for db_name using filters
         """
-        return self.client[db_name].search(filters)
+        return self.rpc(db_name, 'search', self.client[db_name].search, filters)
+
+    def search_read(self, db_name, filters, fields=None, order=None, limit=None, offset=0):
+        """
+        Search data for db_name using filters in one round trip.
+        Fields, order, limit and offset are optional
+        """
+        kwargs = {'domain': filters}
+        if order:
+            kwargs['order'] = order
+        if limit:
+            kwargs['limit'] = limit
+        if offset:
+            kwargs['offset'] = offset
+        # Call execute directly. Proxy search_read asks server version on every call.
+        data = self.rpc(db_name, 'search_read', self.client.execute, db_name, 'search_read', fields=fields, **kwargs)
+        if fields and self.debug_fields:
+            self.report_projection(
+                db_name, data, self.rpc(db_name, 'search_read', self.client.execute, db_name, 'search_read', **kwargs))
+        return data
 
-    def search_read(self, db_name, filters):
+    def iter_search_read(self, db_name, filters, fields=None, order='id', page_size=PAGE_SIZE):
         """
-        Search data for db_name using filters
+        Yield records page by page so big result sets are never
+        buffered in one response. Order should be stable for paging.
         """
-        return self.client[db_name].search_read(filters)
+        offset = 0
+        while True:
+            page = self.search_read(db_name, filters, fields, order=order, limit=page_size, offset=offset)
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
 
     def read(self, db_name, ids, fields=None):
         """
         Read data using ids list or int. Fields is optional
         """
-        return self.client[db_name].read(ids, fields)
+        data = self.rpc(db_name, 'read', self.client[db_name].read, ids, fields)
+        if fields and self.debug_fields:
+            self.report_projection(
+                db_name, data, self.rpc(db_name, 'read', self.client[db_name].read, ids))
+        return data
+
+    @staticmethod
+    def report_projection(db_name, data, full_data):
+        """
+        Print how many bytes field projection saved compared to full read
+        """
+        size = len(json.dumps(data, default=str))
+        full_size = len(json.dumps(full_data, default=str))
+        click.echo(
+            f'{db_name}: {size} bytes, full read {full_size} bytes, '
+            f'saved {full_size - size} bytes',
+            file=sys.stderr)
 
-    def write(self, db_name, ids, field):
+    def send(self, db_name, method, *args):
         """
-        Write data to db_name with id
+        Call method on server now. Used for writes and log replay.
         """
-        return self.client[db_name].write(ids, field)
-    
+        return self.rpc(db_name, method, self.client.execute, db_name, method, *args)
+
+    def queue(self, db_name, method, args, write_dates=None):
+        """
+        Send write like call, or store it to operation log when offline or
+        server is unreachable. Queued create returns temporary negative id.
+        Only writes are queued after a lost answer, other calls could
+        be run twice.
+        """
+        from openerp_proxy.exceptions import ConnectorError
+        from odoohelper.oplog import temporary_id
+        if not self.offline:
+            try:
+                return self.send(db_name, method, *args)
+            except ConnectorError as error:
+                if not is_unreachable(error) or (is_unanswered(error) and method != 'write'):
+                    raise
+                self.offline = True
+        operation_id = self.operation_log().append(db_name, method, list(args), write_dates)
+        return temporary_id(operation_id) if method == 'create' else True
+
+    def write(self, db_name, ids, field, write_dates=None):
+        """
+        Write data to db_name with id. Write_dates has write_date of each
+        id when read, used to detect conflicts if write is queued.
+        """
+        return self.queue(db_name, 'write', (ids, field), write_dates)
+
     def create(self, db_name, fields):
-        return self.client[db_name].create(fields)
+        return self.queue(db_name, 'create', (fields,))
 
     def start_tracking(self, args):
-        return self.client['project.task'].start_tracking(args)
+        return self.queue('project.task', 'start_tracking', (args,))
 
     def terminate_tracking(self, args):
-        return self.client['project.task'].terminate_tracking(args)
\ No newline at end of file
+        return self.queue('project.task', 'terminate_tracking', (args,))
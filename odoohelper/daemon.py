@@ -0,0 +1,221 @@
+"""
+Background daemon and its thin client.
+
+`odoohelper daemon` keeps one authenticated Client, polls changed tasks,
+messages and own attendances to the local cache and runs commands sent
+through a Unix domain socket. When the socket exists main() forwards
+commands to the daemon with forward() before any command module is
+imported, so only this module is loaded by the thin client.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import click
+
+from odoohelper.settings import socket_file
+
+# Seconds between polls
+POLL_INTERVAL = 60
+
+# Commands run in daemon. Others need the terminal.
+SERVED_COMMANDS = ('tasks', 'search', 'project', 'attendance')
+
+# Options that prompt or open an editor
+INTERACTIVE_OPTIONS = {'-i', '--interactive', '--mark-done', '--shift-deadlines'}
+
+# Fields read for own attendances and leaves in addition to fields_for
+ATTENDANCE_FIELDS = {
+    'hr.attendance': ['write_date'],
+    'hr.holidays': ['holiday_type', 'write_date'],
+}
+
+
+def served(args):
+    """ Check if command line can be run by daemon """
+    if not args or args[0] not in SERVED_COMMANDS or INTERACTIVE_OPTIONS & set(args):
+        return False
+    # Search prompts for missing search term
+    return args[0] != 'search' or any(not arg.startswith('-') for arg in args[1:])
+
+
+def forward(args):
+    """
+    Run command line in daemon and print its output. Returns exit code
+    or None if daemon is not running.
+    """
+    path = socket_file()
+    if not os.path.exists(path):
+        return None
+    request = {'args': args, 'cwd': os.getcwd(), 'color': sys.stdout.isatty()}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(path)
+            stream = connection.makefile('rwb')
+            stream.write(json.dumps(request).encode('utf-8') + b'\n')
+            stream.flush()
+            response = json.loads(stream.readline())
+    except (OSError, ValueError):
+        # Stale socket file of stopped daemon
+        return None
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['exit_code']
+
+
+def sync_attendance(client, cache):
+    """
+    Read own attendances and leaves written since last sync and own
+    employee record with tracked task to cache
+    """
+    from odoohelper.fields import fields_for
+    from odoohelper.tasks.commands import read_employee
+
+    read_employee(client, cache)
+
+    for model, extra_fields in ATTENDANCE_FIELDS.items():
+        filters = [('employee_id.user_id.id', '=', client.user.id)]
+        watermark = cache.watermark(model)
+        if watermark:
+            filters.append(('write_date', '>=', watermark))
+        records = client.search_read(model, filters, fields_for(model) + extra_fields)
+        if records:
+            cache.put(model, records)
+        if cache.needs_prune(model):
+            cache.prune(model, client)
+
+
+class Daemon():
+    """
+    Runs commands with shared client. Commands and polls are run one
+    at a time.
+    """
+
+    def __init__(self, client, interval=POLL_INTERVAL):
+        self.client = client
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.polled = None  # Time of last successful poll
+        self.fts = False
+        self.server = None
+
+    def poll(self):
+        """
+        Send queued writes and read changes since last poll. Returns
+        False if server was not reachable.
+        """
+        from openerp_proxy.exceptions import ConnectorError
+        from odoohelper.cache import Cache
+        from odoohelper.client import is_unreachable
+        from odoohelper.metadata import Metadata, stage_map
+        from odoohelper.tasks.tasks import Task
+
+        with self.lock, Cache() as cache:
+            self.client.offline = False
+            try:
+                self.client.replay()
+                if self.client.offline:
+                    return False
+                with Metadata(self.client, cache) as metadata:
+                    done = stage_map(metadata)['done']
+                filters = [
+                    ('user_id', '=', self.client.user.id),
+                    ('stage_id', 'not in', done),
+                ]
+                Task.sync_tasks(self.client, filters, cache)
+                Task.sync_messages(self.client, cache)
+                sync_attendance(self.client, cache)
+                self.fts = cache.fts
+                if cache.fts:
+                    # Keeps all tasks for search and other users
+                    Task.sync_index(self.client, cache)
+            except ConnectorError as error:
+                if not is_unreachable(error):
+                    raise
+                return False
+        self.polled = time.time()
+        return True
+
+    def poll_forever(self):
+        """ Poll until stopped. First poll starts at once. """
+        timeout = 0
+        while not self.stopped.wait(timeout):
+            timeout = self.interval
+            try:
+                self.poll()
+            except Exception as error:
+                # Commands still run, try again on next poll
+                click.echo(f'Poll failed: {error}', err=True)
+
+    def local(self, args):
+        """ Check if command can be answered from cache kept by poll """
+        if self.polled is None or time.time() - self.polled > 2 * self.interval:
+            return False
+        options = set(args[1:])
+        if args[0] == 'attendance':
+            return not options & {'-u', '--user', '-d', '--department'}
+        if args[0] == 'tasks' and options & {'-u', '--user'}:
+            # Tasks of other users are cached only by search index sync
+            return self.fts
+        return args[0] in ('tasks', 'search')
+
+    def run(self, request):
+        """ Run command of request with shared client. Returns response. """
+        from click.testing import CliRunner
+        from odoohelper.odoohelper import cli
+
+        args = request['args']
+        if not served(args):
+            return {'stdout': '', 'stderr': 'Command needs a terminal\n', 'exit_code': 2}
+        with self.lock:
+            os.chdir(request['cwd'])
+            # Reads from cache, writes go to log and are sent below
+            self.client.offline = self.local(args)
+            result = CliRunner().invoke(
+                cli, args + ['--password', self.client.password], input='\n', color=request['color'])
+            self.client.offline = False
+            self.client.replay()
+        stderr = result.stderr
+        if result.exception and not isinstance(result.exception, SystemExit):
+            stderr += f'Error: {result.exception}\n'
+        return {'stdout': result.stdout, 'stderr': stderr, 'exit_code': result.exit_code}
+
+    def serve(self, path=None):
+        """ Serve socket until interrupted """
+        import socketserver
+        from odoohelper.client import set_shared
+
+        daemon = self
+        path = path or socket_file()
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                request = json.loads(self.rfile.readline())
+                self.wfile.write(json.dumps(daemon.run(request)).encode('utf-8') + b'\n')
+
+        if os.path.exists(path):
+            os.remove(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        set_shared(self.client)
+        self.server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        self.server.daemon_threads = True
+        poller = threading.Thread(target=self.poll_forever, daemon=True)
+        poller.start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.stopped.set()
+            self.server.server_close()
+            os.remove(path)
+            set_shared(None)
+            poller.join()
+
+    def shutdown(self):
+        """ Stop serve from another thread """
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
@@ -0,0 +1,88 @@
+"""
+Field projections for Odoo models.
+
+Each entry lists the columns commands actually consume so reads don't
+make Odoo serialize every field of a record.
+"""
+
+FIELDS = {
+    # Consumed by Task.setup. HTML description is loaded on demand.
+    'project.task': [
+        'id',
+        'name',
+        'stage_id',
+        'user_id',
+        'project_id',
+        'full_project_name',
+        'date_deadline',
+        'create_date',
+        'date_start',
+        'date_end',
+        'message_ids',
+        'kanban_state',
+        'planned_hours',
+        'priority',
+        'write_date',
+    ],
+    # Only newest message date is used for priority
+    'mail.message': [
+        'date',
+    ],
+    # Consumed by print_project_page. task_count instead of all task ids.
+    'project.project': [
+        'id',
+        'display_name',
+        'description',
+        'task_count',
+    ],
+    # User prompts
+    'res.users': [
+        'id',
+        'name',
+    ],
+    # Tracking in stop command and attendance team lookup
+    'hr.employee': [
+        'user_id',
+        'current_task',
+    ],
+    # Summed by attendance
+    'hr.attendance': [
+        'employee_id',
+        'check_in',
+        'check_out',
+        'worked_hours',
+    ],
+    'hr.holidays': [
+        'employee_id',
+        'name',
+        'date_from',
+        'date_to',
+        'holiday_status_id',
+    ],
+}
+
+# Light projections for listings and selection prompts
+LIST_FIELDS = {
+    'project.project': [
+        'id',
+        'display_name',
+    ],
+}
+
+# Id and names kept in metadata cache for users, projects and stages
+METADATA_FIELDS = [
+    'id',
+    'name',
+    'display_name',
+    'write_date',
+]
+
+
+def fields_for(model, listing=False):
+    """
+    Return list of fields registered for model. With listing the
+    light projection is returned if model has one.
+    """
+    if listing and model in LIST_FIELDS:
+        return list(LIST_FIELDS[model])
+    return list(FIELDS[model])
@@ -0,0 +1,166 @@
+"""
+Cached metadata for users, projects and stages.
+
+Id, name and display name of small models are kept in the local cache
+so prompts can match names without a server round trip. Cached data
+older than METADATA_TTL is refreshed in background with a write_date
+check. Stage ids for done, inbox and active stages come from config.
+"""
+import difflib
+import time
+
+from odoohelper.fields import METADATA_FIELDS
+from odoohelper.settings import get_config
+
+# Seconds before cached metadata is refreshed
+METADATA_TTL = 60 * 60
+
+# Server side filters for cached models
+FILTERS = {
+    'res.users': [],
+    'project.project': [('is_subtask_project', '=', False)],
+    'project.task.type': [],
+}
+
+# Stage ids by role. Override in config with "stages", ids or names.
+DEFAULT_STAGES = {
+    'done': [8],
+    'inbox': [14],
+    'active': [7, 6],
+}
+
+# Smallest difflib ratio accepted as fuzzy match
+MIN_RATIO = 0.6
+
+
+def fuzzy_score(query, name):
+    """
+    Return match score of query for name or 0. Exact and substring
+    matches rank first, then word prefixes and last similar spelling.
+    """
+    query = query.lower().strip()
+    name = name.lower()
+    if not query:
+        return 0
+    if query == name:
+        return 4
+    if query in name:
+        # Earlier and tighter matches first
+        return 3 - name.index(query) / (len(name) + 1)
+    words = name.split()
+    if all(any(word.startswith(term) for word in words) for term in query.split()):
+        return 2
+    ratio = max(
+        [difflib.SequenceMatcher(None, query, word).ratio() for word in words]
+        + [difflib.SequenceMatcher(None, query, name).ratio()])
+    return ratio if ratio >= MIN_RATIO else 0
+
+
+def find_names(records, names):
+    """ Return ids of records with exactly given names (case insensitive) """
+    wanted = {name.lower() for name in names}
+    return [
+        record['id'] for record in records
+        if (record['name'] or '').lower() in wanted
+        or (record['display_name'] or '').lower() in wanted
+    ]
+
+
+class Metadata():
+    """
+    Metadata lookups backed by Cache
+    """
+
+    def __init__(self, client, cache):
+        self.client = client
+        self.cache = cache
+        self.pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        # Refreshes use cache so finish them before it is closed
+        self.wait()
+
+    def records(self, model):
+        """ Return cached records of model. Loads them first time. """
+        refreshed = self.cache.refreshed(model)
+        if self.client.offline:
+            # Serve what was cached when last online
+            pass
+        elif refreshed is None:
+            self.refresh(model)
+        elif time.time() - refreshed > METADATA_TTL and model not in self.pending:
+            # Serve cached names now, refresh for next lookup
+            self.pending[model] = self.client.submit(self.refresh, model)
+        return list(self.cache.all(model).values())
+
+    def refresh(self, model):
+        """ Read records written since last refresh """
+        filters = list(FILTERS[model])
+        watermark = self.cache.watermark(model)
+        if watermark:
+            filters.append(('write_date', '>=', watermark))
+        records = self.client.search_read(model, filters, METADATA_FIELDS)
+        if records:
+            self.cache.put(model, records)
+        if self.cache.needs_prune(model):
+            self.cache.prune(model, self.client)
+        self.cache.mark_refreshed(model)
+
+    def wait(self):
+        """ Wait for background refreshes """
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.result()
+
+    def match(self, model, query, limit=10):
+        """ Return records best matching query by name """
+        scored = []
+        for record in self.records(model):
+            score = max(
+                fuzzy_score(query, record['display_name'] or ''),
+                fuzzy_score(query, record['name'] or ''))
+            if score:
+                scored.append((-score, record['display_name'] or '', record))
+        scored.sort(key=lambda item: item[:2])
+        if scored and scored[0][0] <= -2:
+            # Similar spellings only when nothing contains the query
+            scored = [item for item in scored if item[0] <= -2]
+        return [record for _, _, record in scored[:limit]]
+
+    def find(self, model, names):
+        """ Return ids of records with exactly given names (case insensitive) """
+        return find_names(self.records(model), names)
+
+
+def stage_map(metadata=None):
+    """
+    Return stage ids by role. Config may give ids or stage names,
+    names are resolved with metadata or without it from stages cached
+    by earlier metadata lookups.
+    """
+    cached = None
+    stages = {}
+    configured = get_config().get('stages', {})
+    for role, default in DEFAULT_STAGES.items():
+        values = configured.get(role, default)
+        if not isinstance(values, list):
+            values = [values]
+        ids = [value for value in values if isinstance(value, int)]
+        names = [value for value in values if isinstance(value, str)]
+        if names:
+            if metadata is not None:
+                found = metadata.find('project.task.type', names)
+            else:
+                if cached is None:
+                    from odoohelper.cache import Cache
+                    with Cache() as cache:
+                        cached = list(cache.all('project.task.type').values())
+                found = find_names(cached, names)
+            if not found:
+                raise ValueError(f'Stages not found: {", ".join(names)}')
+            ids += found
+        stages[role] = ids
+    return stages
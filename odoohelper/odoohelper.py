@@ -3,19 +3,48 @@
 CLI for ODOO. This will automate some tasks and jobs that
 are too time consuming to workout in ODOO.
 """
-import datetime
-import json
+import importlib
 import os
 import sys
 
 import click
-import keyring
 
-from odoohelper.client import Client
-from odoohelper.projects import project_group
-from odoohelper.settings import Settings
-from odoohelper.tasks import Task, tasks_group
-from odoohelper.utils import check_config, get_pass, set_pass, validate_odoo_date
+from odoohelper.settings import Settings, socket_file
+from odoohelper.utils import check_config, resolve_password, set_pass, validate_odoo_date
+
+# Command name to group holding it. Modules are imported only when needed.
+LAZY_COMMANDS = {
+    "attendance": "odoohelper.odoohelper:attendance_group",
+    "daemon": "odoohelper.odoohelper:daemon_group",
+    "set-password": "odoohelper.odoohelper:settings_group",
+    "sync": "odoohelper.odoohelper:sync_group",
+    "instant": "odoohelper.tasks.commands:tasks_group",
+    "stop": "odoohelper.tasks.commands:tasks_group",
+    "create": "odoohelper.tasks.commands:tasks_group",
+    "search": "odoohelper.tasks.commands:tasks_group",
+    "tasks": "odoohelper.tasks.commands:tasks_group",
+    "project": "odoohelper.projects.commands:project_group",
+}
+
+
+class LazyGroup(click.Group):
+    """
+    Group that imports command modules on first use
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.lazy_commands:
+            return super().get_command(ctx, cmd_name)
+        module_name, group_name = self.lazy_commands[cmd_name].split(":")
+        group = getattr(importlib.import_module(module_name), group_name)
+        return group.get_command(ctx, cmd_name)
 
 
 @click.group()
@@ -31,18 +60,145 @@ def set_password(password):
     click.echo("Password set")
 
 
+@click.group()
+def sync_group():
+    pass
+
+
+@sync_group.command()
+@click.password_option(
+    prompt=False, confirmation_prompt=False, callback=resolve_password
+)
+@click.option(
+    "--force", is_flag=True, help="Send also conflicting and failed operations"
+)
+@click.option(
+    "--discard", is_flag=True, help="Drop conflicting and failed operations"
+)
+def sync(password, force=False, discard=False):
+    """Send changes made while offline"""
+    from datetime import datetime
+    from odoohelper.client import Client
+
+    check_config()
+    with Settings() as config:
+        client = Client.from_config(config, password)
+    client.connect()
+    log = client.operation_log()
+    if client.offline:
+        click.echo(f"Server not reachable, {log.count()} operations queued")
+        return
+    if client.replayed:
+        click.echo(f"{client.replayed.applied} operations sent")
+    if force:
+        replayed = client.replay(force=True)
+        if replayed:
+            click.echo(f"{replayed.applied} operations sent")
+    conflicts = log.pending(conflicts=True)
+    if discard:
+        log.remove([operation.id for operation in conflicts])
+        click.echo(f"{len(conflicts)} operations discarded")
+        return
+    for operation in conflicts:
+        created = datetime.fromtimestamp(operation.created).isoformat(timespec="seconds")
+        click.echo(
+            f"{created} {operation.model} {operation.method} "
+            f"{operation.args}: {operation.conflict or 'waiting'}"
+        )
+    if not conflicts:
+        click.echo("No pending operations")
+
+
+@click.group()
+def daemon_group():
+    pass
+
+
+@daemon_group.command()
+@click.password_option(
+    prompt=False, confirmation_prompt=False, callback=resolve_password
+)
+@click.option(
+    "--interval",
+    metavar="<seconds>",
+    type=int,
+    default=60,
+    help="Seconds between checks for changes in server",
+)
+def daemon(password, interval):
+    """Keep connection and cache open for faster commands.
+
+    tasks, search, project and attendance are run by daemon while it is
+    running. Stop with Ctrl+C.
+    """
+    from odoohelper.client import Client
+    from odoohelper.daemon import Daemon
+
+    check_config()
+    with Settings() as config:
+        client = Client.from_config(config, password)
+    client.connect()
+    click.echo(f"Serving {socket_file()}", err=True)
+    try:
+        Daemon(client, interval).serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
 @click.group()
 def attendance_group():
     # Collection for attendance commands
     pass
 
 
+def find_users(client, names=(), department=None):
+    """
+    Return list of (user id, name) matching any of the names or
+    employees of the department
+    """
+    from odoohelper.fields import fields_for
+
+    users = []
+    if names:
+        filters = ["|"] * (len(names) - 1)
+        filters += [("name", "ilike", name) for name in names]
+        users += [
+            (user["id"], user["name"])
+            for user in client.search_read("res.users", filters, fields_for("res.users"))
+        ]
+    if department:
+        employees = client.search_read(
+            "hr.employee",
+            [("department_id.name", "ilike", department), ("user_id", "!=", False)],
+            fields_for("hr.employee"),
+        )
+        users += [tuple(employee["user_id"]) for employee in employees]
+    # Remove duplicates but keep order
+    return list(dict.fromkeys(users))
+
+
 @attendance_group.command()
 @click.password_option(
-    prompt=True if get_pass() is None else False, confirmation_prompt=False
+    prompt=False, confirmation_prompt=False, callback=resolve_password
+)
+@click.option(
+    "-u",
+    "--user",
+    "users",
+    metavar="<user full name>",
+    multiple=True,
+    help="User display name in Odoo. Repeat for team report",
 )
 @click.option(
-    "-u", "--user", metavar="<user full name>", help="User display name in Odoo"
+    "-d",
+    "--department",
+    metavar="<department name>",
+    help="Team report for employees of department",
+)
+@click.option(
+    "--csv", "as_csv", is_flag=True, help="Print team report as CSV"
 )
 @click.option(
     "--month",
@@ -69,13 +225,14 @@ def attendance_group():
     callback=validate_odoo_date,
     help="Show records up to date",
 )
-def attendance(password, user, period, start=None, end=None):
+def attendance(password, users, department, as_csv, period, start=None, end=None):
     """
     Retrieves timesheet and totals it for the current month.
     """
     from datetime import datetime, timedelta
-    import pytz
-    import holidays
+    from odoohelper.attendance import compute_balance
+    from odoohelper.client import Client
+    from odoohelper.fields import fields_for
 
     def colored_diff(title, diff, notes=None, invert=False):
         positive_color = "green"
@@ -96,23 +253,26 @@ def attendance(password, user, period, start=None, end=None):
             + click.style(notes, fg="magenta")
         )
 
-    if password is None:
-        password = get_pass()
     check_config()
     with Settings() as config:
-        client = Client(
-            username=config["username"],
-            password=password,
-            database=config["database"],
-            host=config["host"],
-        )
+        client = Client.from_config(config, password)
     client.connect()
-    if not user:
-        user_id = client.user.id
-
-    filters = [("employee_id.user_id.id", "=", user_id)]
+    if client.offline and (users or department):
+        # Only own records are cached
+        raise click.ClickException("Attendance of other users needs a server connection")
+    if not users and not department:
+        selected_users = [(client.user.id, client.user.login)]
+    else:
+        selected_users = find_users(client, users, department)
+        if not selected_users:
+            click.echo("No users found")
+            return
+    user_ids = [user_id for user_id, _ in selected_users]
+    team = len(selected_users) > 1 or bool(department)
+
+    filters = [("employee_id.user_id.id", "in", user_ids)]
     filters_leave = [
-        ("employee_id.user_id.id", "=", user_id),
+        ("employee_id.user_id.id", "in", user_ids),
         ("holiday_type", "=", "employee"),
     ]
 
@@ -149,135 +309,91 @@ def attendance(password, user, period, start=None, end=None):
     # Add end cutoff for leaves
     filters_leave.append(("date_to", "<", end.strftime("%Y-%m-%d 00:00:00")))
 
-    attendance_ids = client.search("hr.attendance", filters)
-    attendances = client.read("hr.attendance", attendance_ids)
-
-    leave_ids = client.search("hr.holidays", filters_leave)
-    leaves = client.read("hr.holidays", leave_ids)
-
-    def daterange(start_date, end_date):
-        # Always emit at least one day
-        for n in range(int((end_date - start_date).days) + 1):
-            yield start_date + timedelta(n)
-
-    # Pre-process the weeks and days
-    weeks = {}
-    # @TODO Assumes user is in Finland
-    local_holidays = holidays.FI()
-
-    # Faux data to test holidays
-    # attendances.append({
-    #     'check_in': '2018-01-01 00:00:00',
-    #     'check_out': '2018-01-01 02:00:00',
-    #     'worked_hours': 2
-    # })
-
-    # Process attendances
-    for attendance in attendances:
-        # Get a localized datetime object
-        # @TODO This assumes the server returns times as EU/Helsinki
-        date = pytz.timezone("Europe/Helsinki").localize(
-            datetime.strptime(attendance["check_in"], "%Y-%m-%d %H:%M:%S")
-        )
+    if client.offline and not team:
+        from odoohelper.cache import Cache, match_domain
+
+        # Own records are kept in cache by daemon. First term is the user.
+        with Cache() as cache:
+            attendances = [
+                record
+                for record in cache.all("hr.attendance").values()
+                if match_domain(record, filters[1:])
+            ]
+            leaves = [
+                record
+                for record in cache.all("hr.holidays").values()
+                if match_domain(record, filters_leave[1:])
+            ]
+    else:
+        # One query per model for all users, all models concurrently
+        futures = [
+            client.submit(
+                client.search_read,
+                "hr.attendance",
+                filters,
+                fields_for("hr.attendance"),
+            ),
+            client.submit(
+                client.search_read,
+                "hr.holidays",
+                filters_leave,
+                fields_for("hr.holidays"),
+            ),
+        ]
+        if team:
+            # Maps records to users so users without attendances get a row too
+            futures.append(
+                client.submit(
+                    client.search_read,
+                    "hr.employee",
+                    [("user_id", "in", user_ids)],
+                    fields_for("hr.employee"),
+                )
+            )
+        attendances, leaves, *employees = client.gather(*futures)
+
+    if team:
+        # Group records by user in memory, one row per selected user
+        employee_users = {
+            employee["id"]: employee["user_id"][0] for employee in employees[0]
+        }
+        records = {user_id: ([], []) for user_id in user_ids}
+        for record in attendances:
+            user_id = employee_users.get(record["employee_id"][0])
+            if user_id in records:
+                records[user_id][0].append(record)
+        for record in leaves:
+            user_id = employee_users.get(record["employee_id"][0])
+            if user_id in records:
+                records[user_id][1].append(record)
+        rows = []
+        for user_id, name in sorted(selected_users, key=lambda user: user[1]):
+            employee_attendances, employee_leaves = records[user_id]
+            balance = compute_balance(employee_attendances, employee_leaves, start, end)
+            rows.append(
+                (
+                    name,
+                    f"{balance.total_hours:.2f}",
+                    f"{balance.total_diff:+.2f}",
+                    f"{(balance.total_diff + balance.day_diff):+.2f}",
+                    f"{(balance.allocated_today - balance.hours_today):+.2f}",
+                )
+            )
+        topics = ("Employee", "Worked", "Balance yesterday", "Balance now", "Allocated today")
+        if as_csv:
+            import csv
+
+            writer = csv.writer(click.get_text_stream("stdout"))
+            writer.writerow(topics)
+            writer.writerows(rows)
+        else:
+            click.echo(click.style("\t".join(topics), fg="blue"))
+            for row in rows:
+                click.echo("\t".join(row))
+        return
+
+    balance = compute_balance(attendances, leaves, start, end)
 
-        # If there is no checkout time, sum to now
-        if attendance["check_out"] == False:
-            # @TODO Same as above
-            now = pytz.timezone("Europe/Helsinki").localize(datetime.utcnow())
-            attendance["worked_hours"] = (now - date).seconds / 3600
-
-        # Get the day and week index keys (Key = %Y-%m-%d)
-        day_key = date.strftime("%Y-%m-%d")
-        # Counts weeks from first Monday of the year
-        week_key = date.strftime("%W")
-
-        if week_key not in weeks:
-            weeks[week_key] = {}
-
-        if day_key not in weeks[week_key]:
-            # @TODO Assumes 7.5 hours per day
-            weeks[week_key][day_key] = {
-                "allocated_hours": 7.5,
-                "worked_hours": 0,
-                "overtime": False,
-                "sick_leave": False,
-                "compensatory": False,
-                "notes": None,
-            }
-
-        # Sum the attendance
-        weeks[week_key][day_key]["worked_hours"] += attendance["worked_hours"]
-
-    for date in daterange(start, end):
-        # Get the day and week index keys (Key = %Y-%m-%d)
-        day_key = date.strftime("%Y-%m-%d")
-        # Counts weeks from first Monday of the year
-        week_key = date.strftime("%W")
-        if day_key not in weeks.get(week_key, {}):
-            # We don't care, no attendances for this day
-            continue
-
-        if day_key in local_holidays:
-            # This day is a holiday, no allocated hours
-            weeks[week_key][day_key]["overtime"] = True
-            weeks[week_key][day_key]["notes"] = local_holidays.get(day_key)
-            weeks[week_key][day_key]["allocated_hours"] = 0
-
-        if date.weekday() > 4:
-            # Weekend, assume everything is overtime
-            weeks[week_key][day_key]["overtime"] = True
-            weeks[week_key][day_key]["notes"] = "Weekend"
-            weeks[week_key][day_key]["allocated_hours"] = 0
-
-    # Process any leaves
-    now = pytz.timezone("Europe/Helsinki").localize(datetime.utcnow())
-    for leave in leaves:
-        leave_start = pytz.timezone("Europe/Helsinki").localize(
-            datetime.strptime(leave["date_from"], "%Y-%m-%d %H:%M:%S")
-        )
-        if leave_start > now:
-            # We don't care about leaves into the future
-            continue
-        leave_end = pytz.timezone("Europe/Helsinki").localize(
-            datetime.strptime(leave["date_to"], "%Y-%m-%d %H:%M:%S")
-        )
-        leave_status_id, _ = leave["holiday_status_id"]
-        for date in daterange(leave_start, leave_end):
-            # Get the day and week index keys (Key = %Y-%m-%d)
-            day_key = date.strftime("%Y-%m-%d")
-            # Counts weeks from first Monday of the year
-            week_key = date.strftime("%W")
-            if day_key not in weeks.get(week_key, {}):
-                # We don't care, no attendances for this day
-                continue
-            elif leave_status_id == 2:  # Sick leave
-                weeks[week_key][day_key]["sick_leave"] = True
-                weeks[week_key][day_key]["notes"] = f"Sick Leave"
-                weeks[week_key][day_key]["allocated_hours"] = 0
-            elif leave_status_id == 3:  # Compensatory days
-                # Spent banked hours (full days)
-                if day_key not in weeks[week_key]:
-                    weeks[week_key][day_key] = {
-                        "allocated_hours": 7.5,
-                        "worked_hours": 0,
-                        "overtime": False,
-                        "sick_leave": False,
-                        "compensatory": True,
-                        "notes": f'Compensatory Day: {leave["name"]}',
-                    }
-                else:
-                    weeks[week_key][day_key]["compensatory"] = True
-                    weeks[week_key][day_key][
-                        "notes"
-                    ] = f'Compensatory Day: {leave["name"]}'
-            else:
-                weeks[week_key][day_key]["overtime"] = True
-                weeks[week_key][day_key]["notes"] = f'Leave: {leave["name"]}'
-                weeks[week_key][day_key]["allocated_hours"] = 0
-
-    total_diff = 0
-    total_hours = 0
-    day_diff = 0
     click.echo(
         click.style(
             f'Balance as of {(datetime.today().isoformat(timespec="seconds"))} (system time)',
@@ -285,69 +401,83 @@ def attendance(password, user, period, start=None, end=None):
         )
     )
     click.echo(click.style("Day\t\tWorked\tDifference", fg="blue"))
-    for _, week in sorted(weeks.items()):
-        for key, day in sorted(week.items()):
-            # Skip if no hours worked and not a compensatory day
-            if day["worked_hours"] == 0.0 and not day["compensatory"]:
-                continue
-
-            worked_hours = day["worked_hours"]
-            allocated_hours = day["allocated_hours"]
-
-            worked = "{:.2f}".format(worked_hours)
-            title = f"{key}\t{worked}"
-            diff = "{:+.2f}".format(worked_hours - allocated_hours)
-            notes = day.get("notes", None)
-
-            # For sick days, list worked hours but striked-through
-            # Diff defaults at 0.00 hours
-            if day["sick_leave"]:
-                # Messy but seems to work for the most parts
-                worked = "\u0336" + "\u0336".join(worked)
-                title = "{}\t\u0336{}".format(key, "\u0336".join(worked))
-                diff = " 0.00"
-
-            if day["compensatory"]:
-                # Always ensure worked hours are zero
-                worked_hours = 0
-
-            # Print the diff line
-            colored_diff(title, f"{diff}", notes)
-
-            # Skip calculating this if it's a sick leave
-            if day["sick_leave"]:
-                continue
-
-            if key == datetime.today().strftime("%Y-%m-%d"):
-                day_diff += worked_hours - allocated_hours
-            else:
-                total_diff += worked_hours - allocated_hours
-            total_hours += worked_hours
-
-    today = datetime.now().strftime("%Y-%m-%d")
-    this_week = datetime.now().strftime("%W")
-    hours_today = 0
-    allocated_today = 0
-    if today in weeks.get(this_week, {}):
-        hours_today = weeks[this_week][today]["worked_hours"]
-        allocated_today = weeks[this_week][today]["allocated_hours"]
+    for day in balance.days:
+        key = day.date.strftime("%Y-%m-%d")
+        worked = "{:.2f}".format(day.worked_hours)
+        title = f"{key}\t{worked}"
+        diff = "{:+.2f}".format(day.diff)
+
+        # For sick days, list worked hours but striked-through
+        # Diff defaults at 0.00 hours
+        if day.sick_leave:
+            # Messy but seems to work for the most parts
+            worked = "\u0336" + "\u0336".join(worked)
+            title = "{}\t\u0336{}".format(key, "\u0336".join(worked))
+            diff = " 0.00"
+
+        # Print the diff line
+        colored_diff(title, f"{diff}", day.notes)
 
     click.echo(click.style("---\t\t------\t-----", fg="blue"))
-    colored_diff(f"Totals:\t\t{total_hours:.2f}", f"{(total_diff + day_diff):+.2f}")
+    colored_diff(
+        f"Totals:\t\t{balance.total_hours:.2f}",
+        f"{(balance.total_diff + balance.day_diff):+.2f}",
+    )
     print()
-    colored_diff("Balance yesterday:", f"{total_diff:+.2f}")
-    colored_diff("Balance now:\t", f"{(total_diff + day_diff):+.2f}")
+    colored_diff("Balance yesterday:", f"{balance.total_diff:+.2f}")
+    colored_diff(
+        "Balance now:\t", f"{(balance.total_diff + balance.day_diff):+.2f}"
+    )
     colored_diff(
-        "Allocated hours today:", f"{(allocated_today - hours_today):+.2f}", invert=True
+        "Allocated hours today:",
+        f"{(balance.allocated_today - balance.hours_today):+.2f}",
+        invert=True,
     )
 
 
-cli = click.CommandCollection(
-    sources=[attendance_group, tasks_group, project_group, settings_group]
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
+@click.option("--trace", is_flag=True, help="Print summary of server calls at exit")
+@click.option(
+    "--trace-file",
+    metavar="<file>",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Append each server call as JSON line to file",
+)
+@click.option(
+    "--offline",
+    is_flag=True,
+    help="Use local cache and queue changes without connecting to server",
 )
+@click.pass_context
+def cli(ctx, trace=False, trace_file=None, offline=False):
+    if offline:
+        from odoohelper import client
+
+        client.set_offline(True)
+        ctx.call_on_close(lambda: client.set_offline(False))
+    if trace or trace_file:
+        from odoohelper import trace as rpc_trace
+
+        tracer = rpc_trace.start(trace_file)
+
+        def finish():
+            rpc_trace.stop()
+            if trace:
+                tracer.print_summary()
+
+        ctx.call_on_close(finish)
 
 
 def main():
+    args = sys.argv[1:]
+    # Daemon client is loaded only when a daemon may be running
+    if os.path.exists(socket_file()):
+        from odoohelper.daemon import forward, served
+
+        if served(args):
+            exit_code = forward(args)
+            if exit_code is not None:
+                sys.exit(exit_code)
     cli()
 
 
@@ -0,0 +1,222 @@
+"""
+Durable log of server writes made while offline.
+
+Writes, creates and time tracking calls are stored in the cache
+database and replayed in batches when the server is reachable.
+Records changed on server after they were read are reported as
+conflicts instead of being overwritten. Operations the server rejects
+are marked failed so later operations and commands are not blocked.
+"""
+import json
+import time
+from collections import namedtuple
+
+Operation = namedtuple('Operation', ['id', 'model', 'method', 'args', 'write_dates', 'created', 'conflict'])
+
+Replay = namedtuple('Replay', ['applied', 'conflicts'])
+
+# Reason stored for operation server may have run without answering
+UNANSWERED = 'no answer from server, check if it was applied'
+
+# Methods that can be queued
+METHODS = ('write', 'create', 'start_tracking', 'terminate_tracking')
+
+
+def failure(error):
+    """ Reason stored for operation rejected by server """
+    return f'failed: {getattr(error, "data_message", None) or error}'
+
+
+def temporary_id(operation_id):
+    """ Id returned for records created offline until replay """
+    return -operation_id
+
+
+class OperationLog():
+    """
+    Operation log stored in Cache database
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def append(self, model, method, args, write_dates=None):
+        """ Store operation and return its id """
+        if method not in METHODS:
+            raise ValueError(f'Method {method} can not be queued')
+        with self.cache.lock:
+            cursor = self.cache.db.execute(
+                'INSERT INTO operations (model, method, args, write_dates, created) VALUES (?, ?, ?, ?, ?)',
+                (model, method, json.dumps(args), json.dumps(write_dates or {}), time.time()))
+            self.cache.db.commit()
+        return cursor.lastrowid
+
+    def pending(self, conflicts=False):
+        """ Return operations in order. Conflicting ones only if conflicts is set. """
+        query = 'SELECT id, model, method, args, write_dates, created, conflict FROM operations'
+        if not conflicts:
+            query += ' WHERE conflict IS NULL'
+        with self.cache.lock:
+            rows = self.cache.db.execute(query + ' ORDER BY id').fetchall()
+        return [
+            Operation(op_id, model, method, json.loads(args), json.loads(write_dates), created, conflict)
+            for op_id, model, method, args, write_dates, created, conflict in rows
+        ]
+
+    def count(self):
+        with self.cache.lock:
+            return self.cache.db.execute('SELECT COUNT(*) FROM operations').fetchone()[0]
+
+    def remove(self, operation_ids):
+        with self.cache.lock:
+            self.cache.db.executemany('DELETE FROM operations WHERE id = ?', [(i,) for i in operation_ids])
+            self.cache.db.commit()
+
+    def mark_conflict(self, operation_id, reason):
+        with self.cache.lock:
+            self.cache.db.execute('UPDATE operations SET conflict = ? WHERE id = ?', (reason, operation_id))
+            self.cache.db.commit()
+
+    def remap(self, temporary, real):
+        """ Replace temporary id with real id in waiting operations """
+        for operation in self.pending(conflicts=True):
+            args = replace_id(operation.args, temporary, real)
+            if args != operation.args:
+                with self.cache.lock:
+                    self.cache.db.execute(
+                        'UPDATE operations SET args = ? WHERE id = ?', (json.dumps(args), operation.id))
+                    self.cache.db.commit()
+
+    def last_started(self):
+        """ Task ids of queued start_tracking not yet terminated or None """
+        for operation in reversed(self.pending()):
+            if operation.method == 'terminate_tracking':
+                return None
+            if operation.method == 'start_tracking':
+                return operation.args[0]
+        return None
+
+    def replay(self, client, force=False):
+        """
+        Send queued operations to server in order. Consecutive writes are
+        merged per record and records with identical changes are written
+        with one call. With force conflicting and failed operations are
+        sent too. Unreachable server stops replay, other server errors
+        only mark the operation failed. Operations other than writes are
+        not repeated if server may have run them without answering.
+        """
+        from openerp_proxy.exceptions import ConnectorError
+        from odoohelper.client import is_unanswered, is_unreachable
+
+        applied = 0
+        conflicts = []
+        batch = []
+        # Temporary id -> created id
+        created = {}
+        for operation in self.pending(conflicts=force):
+            args = operation.args
+            for temporary, real in created.items():
+                args = replace_id(args, temporary, real)
+            operation = operation._replace(args=args)
+            if operation.method == 'write':
+                batch.append(operation)
+                continue
+            applied += self.flush(client, batch, force, conflicts)
+            batch = []
+            try:
+                result = client.send(operation.model, operation.method, *args)
+            except ConnectorError as error:
+                if is_unanswered(error):
+                    self.mark_conflict(operation.id, UNANSWERED)
+                if is_unreachable(error):
+                    raise
+                self.mark_conflict(operation.id, failure(error))
+                conflicts.append((operation, failure(error)))
+                continue
+            self.remove([operation.id])
+            if operation.method == 'create':
+                # Operations left in log after a failure use created id too
+                self.remap(temporary_id(operation.id), result)
+                created[temporary_id(operation.id)] = result
+            applied += 1
+        applied += self.flush(client, batch, force, conflicts)
+        return Replay(applied, conflicts)
+
+    def flush(self, client, batch, force, conflicts):
+        """ Write merged batch of write operations. Returns applied count. """
+        from openerp_proxy.exceptions import ConnectorError
+        from odoohelper.client import is_unreachable
+
+        if not batch:
+            return 0
+        # (model, id) -> [vals, write_date when read, operation ids]
+        merged = {}
+        for operation in batch:
+            ids, vals = operation.args
+            for record_id in ids:
+                entry = merged.setdefault(
+                    (operation.model, record_id), [{}, operation.write_dates.get(str(record_id)), []])
+                entry[0].update(vals)
+                entry[2].append(operation.id)
+        conflicting = {}
+        if not force:
+            conflicting = self.conflicts(client, merged)
+        groups = {}
+        for (model, record_id), (vals, _, _) in merged.items():
+            if (model, record_id) not in conflicting:
+                key = (model, json.dumps(vals, sort_keys=True))
+                groups.setdefault(key, (vals, []))[1].append(record_id)
+        for (model, _), (vals, ids) in groups.items():
+            try:
+                client.send(model, 'write', ids, vals)
+            except ConnectorError as error:
+                if is_unreachable(error):
+                    raise
+                conflicting.update({(model, i): failure(error) for i in ids})
+        for operation in batch:
+            reasons = [conflicting[(operation.model, i)] for i in operation.args[0] if (operation.model, i) in conflicting]
+            if reasons:
+                self.mark_conflict(operation.id, reasons[0])
+                conflicts.append((operation, reasons[0]))
+        done = [operation.id for operation in batch if operation.id not in {c[0].id for c in conflicts}]
+        self.remove(done)
+        return len(done)
+
+    @staticmethod
+    def conflicts(client, merged):
+        """
+        Return (model, id) -> reason for records changed on server since
+        read or whose model server rejects
+        """
+        from openerp_proxy.exceptions import ConnectorError
+        from odoohelper.client import is_unreachable
+
+        checked = {}
+        for (model, record_id), (_, write_date, _) in merged.items():
+            if write_date:
+                checked.setdefault(model, {})[record_id] = write_date
+        conflicting = {}
+        for model, write_dates in checked.items():
+            try:
+                rows = client.search_read(model, [('id', 'in', list(write_dates))], ['write_date'])
+            except ConnectorError as error:
+                if is_unreachable(error):
+                    raise
+                conflicting.update({(model, i): failure(error) for i in write_dates})
+                continue
+            server = {row['id']: row['write_date'] for row in rows}
+            for record_id, write_date in write_dates.items():
+                if record_id not in server:
+                    conflicting[(model, record_id)] = 'deleted on server'
+                elif server[record_id] != write_date:
+                    conflicting[(model, record_id)] = f'changed on server at {server[record_id]}'
+        return conflicting
+
+
+def replace_id(args, temporary, real):
+    """ Return args with temporary id replaced in id lists and values """
+    if isinstance(args, list):
+        return [replace_id(arg, temporary, real) for arg in args]
+    if isinstance(args, dict):
+        return {key: replace_id(value, temporary, real) for key, value in args.items()}
+    return real if args == temporary else args
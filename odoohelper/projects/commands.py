@@ -1,137 +1,190 @@
 import datetime
+import os
 import sys
 
 import click
 
+from odoohelper.cache import Cache
 from odoohelper.client import Client
+from odoohelper.fields import fields_for
+from odoohelper.metadata import Metadata, stage_map
 from odoohelper.settings import Settings
 from odoohelper.tasks import Task
-from odoohelper.utils import check_config, get_pass
+from odoohelper.utils import check_config, resolve_password
 
 
-def print_project_page(client, project, limit=None):
-    """ Print project page as markdown """
-    if not limit:
-        click.echo(f'## {project["display_name"]}')
-        click.echo(f'{project["description"]}')
-    if len(project['tasks']) == 0:
-        click.echo(f'No tasks...')
+def print_project_page(client, project, limit=None, cache=None, stages=None):
+    """ Print project page as markdown. stages is result of stage_map. """
+    stages = stages or stage_map()
+    if project['task_count'] == 0:
+        click.echo(render_project_page(project, [], [], limit), nl=False)
         return
-    
-    # Inbox 14
-    # Tehty 8
-    # Työn alla 7
-    # Tilattu 6
-    # Read tasks
+    # Read both task lists with one sync and split them by stage
     filters = [
-        '&',
         ('project_id', '=', project['id']),
-        '|',
-        ('stage_id', '=', 7),
-        ('stage_id', '=', 6),
+        ('stage_id', 'in', stages['active'] + stages['inbox']),
     ]
+    active_tasks, inbox_tasks = [], []
+    for task in Task.fetch_tasks(client, filters, cache):
+        (inbox_tasks if task.stage[0] in stages['inbox'] else active_tasks).append(task)
+    click.echo(render_project_page(project, active_tasks, inbox_tasks, limit), nl=False)
 
-    active_tasks = Task.fetch_tasks(client, filters)
-    active_tasks = sorted(active_tasks, key=lambda x: x.priority, reverse=True)
-    filters = [
-        '&',
-        ('project_id', '=', project['id']),
-        ('stage_id', '=', 14),
-    ]
-    inbox_tasks = Task.fetch_tasks(client, filters)
-    inbox_tasks = sorted(inbox_tasks, key=lambda x: x.priority, reverse=True)
-    if len(active_tasks) == 0 and len(inbox_tasks) == 0:
-        click.echo('No active or inbox tasks')
-        return
-    # Build gantt
-    click.echo('\n### Status')
-    # Find start date for this gantt (first task start date or create date)
+
+def gantt(tasks, oldest_date):
+    """ Return PlantUML gantt lines for tasks """
+    lines = ['@startuml\n@startgantt']
+    lines.append(f'project starts the {oldest_date.date()}')
+    lines.append('saturday are closed\nsunday are closed')
+    for task in tasks:
+        name = task.name.replace("[","").replace("]","")
+        lines.append(f'[{name}] starts on {task.start().date()}')
+        lines.append(f'[{name}] ends on {task.end().date()}')
+    lines.append('@endgantt\n@enduml')
+    return lines
+
+
+def oldest_start(tasks):
+    """ Find start date for gantt (first task start date or create date) """
     oldest_date = datetime.datetime.now()
-    for task in active_tasks:
+    for task in tasks:
         if task.start_date:
             if task.start_date < oldest_date:
                 oldest_date = task.start_date
         else:
             if task.create_date < oldest_date:
                 oldest_date = task.create_date
-    click.echo('\n### Active tasks')
-    click.echo('@startuml\n@startgantt')
-    click.echo(f'project starts the {oldest_date.date()}')
-    click.echo('saturday are closed\nsunday are closed')
+    return oldest_date
+
+
+def render_project_page(project, active_tasks, inbox_tasks, limit=None):
+    """ Return project page as markdown with gantt charts """
+    lines = []
+    if not limit:
+        lines.append(f'## {project["display_name"]}')
+        lines.append(f'{project["description"]}')
+    if project['task_count'] == 0:
+        lines.append(f'No tasks...')
+        return '\n'.join(lines) + '\n'
+    active_tasks = sorted(active_tasks, key=lambda x: x.priority, reverse=True)
+    inbox_tasks = sorted(inbox_tasks, key=lambda x: x.priority, reverse=True)
+    if len(active_tasks) == 0 and len(inbox_tasks) == 0:
+        lines.append('No active or inbox tasks')
+        return '\n'.join(lines) + '\n'
     if not limit:
         limit = len(active_tasks)
+    # Build gantt
+    lines.append('\n### Status')
+    lines.append('\n### Active tasks')
+    lines.extend(gantt(active_tasks[:limit], oldest_start(active_tasks)))
+    lines.append(f'\n{Task.print_topic(print_format="md")}')
     for task in active_tasks[:limit]:
-        # click.echo(f'[{task.name.replace("[","").replace("]","")}] lasts {task.days()} days')
-        click.echo(f'[{task.name.replace("[","").replace("]","")}] starts on {task.start().date()}')
-        click.echo(f'[{task.name.replace("[","").replace("]","")}] ends on {task.end().date()}')
-    click.echo('@endgantt\n@enduml')
-
-    click.echo(f'\n{Task.print_topic(print_format="md")}')
-    for task in active_tasks[:limit]:
-        click.echo(task.as_formatted('md'))
+        lines.append(task.as_formatted('md'))
 
-    # Find start date for this gantt (first task start date or create date)
-    oldest_date = datetime.datetime.now()
+    lines.append('\n### Inbox tasks')
+    lines.extend(gantt(inbox_tasks[:limit], oldest_start(inbox_tasks[:limit])))
+    lines.append(f'\n{Task.print_topic(print_format="md")}')
     for task in inbox_tasks[:limit]:
-        if task.start_date:
-            if task.start_date < oldest_date:
-                oldest_date = task.start_date
-        else:
-            if task.create_date < oldest_date:
-                oldest_date = task.create_date
+        lines.append(task.as_formatted('md'))
+    return '\n'.join(lines) + '\n'
+
+
+def write_project_page(path, project, active_tasks, inbox_tasks):
+    """ Render project page to file. Runs in worker process. """
+    with open(path, 'w') as f:
+        f.write(render_project_page(project, active_tasks, inbox_tasks))
+    return path
+
+
+def write_project_pages(client, projects, output_dir, cache=None, jobs=None, stages=None):
+    """
+    Write one page per project to output_dir. Tasks of all projects
+    are read with one query and grouped by project and stage in memory.
+    Pages are rendered in a process pool. Yields written paths.
+    """
+    # Process pool import is slow, load it only when pages are written
+    from concurrent.futures import ProcessPoolExecutor
+
+    stages = stages or stage_map()
+    projects = list(projects)
+    filters = [
+        ('project_id', 'in', [project['id'] for project in projects]),
+        ('stage_id', 'in', stages['active'] + stages['inbox']),
+    ]
+    grouped = {project['id']: ([], []) for project in projects}
+    for task in Task.fetch_tasks(client, filters, cache):
+        if not task.project_id or task.project_id[0] not in grouped:
+            continue
+        active, inbox = grouped[task.project_id[0]]
+        (inbox if task.stage[0] in stages['inbox'] else active).append(task)
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(
+                write_project_page,
+                os.path.join(output_dir, f'project-{project["id"]}.md'),
+                project,
+                *grouped[project['id']])
+            for project in projects
+        ]
+        for future in futures:
+            yield future.result()
 
-    click.echo('\n### Inbox tasks')
-    click.echo('@startuml\n@startgantt')
-    click.echo(f'project starts the {oldest_date.date()}')
-    click.echo('saturday are closed\nsunday are closed')
-    for task in inbox_tasks[:limit]:
-        click.echo(f'[{task.name.replace("[","").replace("]","")}] starts on {task.start().date()}')
-        click.echo(f'[{task.name.replace("[","").replace("]","")}] ends on {task.end().date()}')
-    click.echo('@endgantt\n@enduml')
-    
-    click.echo(f'\n{Task.print_topic(print_format="md")}')
-    for task in inbox_tasks[:limit]:
-        click.echo(task.as_formatted('md'))
 
 @click.group()
 def project_group():
     pass
 
 @project_group.command()
-@click.password_option(prompt=True if get_pass() is None else False, confirmation_prompt=False)
+@click.password_option(prompt=False, confirmation_prompt=False, callback=resolve_password)
 @click.option('-l','--list-projects', help="List projects and their id", is_flag=True)
 @click.option('-p','--project', metavar="<project id>", help="Print project information")
 @click.option('-s','--summary', metavar="<project id>", help="Print project summary")
 @click.option('-t','--sub-tasks', help="Show subtasks in list-projects", is_flag=True, default=False)
-def project(password, list_projects, project, summary, sub_tasks):
+@click.option('-a','--all', 'all_projects', help="Write pages of all projects to output directory", is_flag=True)
+@click.option('--ids', metavar="<id,id,...>", help="Write pages of these projects to output directory")
+@click.option('-o','--output-dir', metavar="<directory>", default='projects', show_default=True, help="Directory for --all/--ids pages")
+@click.option('-j','--jobs', metavar="<N>", type=int, help="Worker processes rendering pages")
+def project(password, list_projects, project, summary, sub_tasks, all_projects=False, ids=None, output_dir='projects', jobs=None):
     """ Return active projects"""
-    if not list_projects and (not project and not summary):
-        click.echo("Select --list-projects or --project/--summary")
+    if not list_projects and (not project and not summary) and not all_projects and not ids:
+        click.echo("Select --list-projects, --project/--summary or --all/--ids")
         return
-    if password is None:
-        password = get_pass()
     check_config()
     with Settings() as config:
-        client = Client(username=config['username'], password=password, database=config['database'], host=config['host'])
+        client = Client.from_config(config, password)
     client.connect()
-    
-    filters = []
-    if not sub_tasks:
-        filters.append(('is_subtask_project', '=', False))
+    if client.offline:
+        raise click.ClickException("Project pages need a server connection")
 
-    projects = client.search_read('project.project', filters)
     if list_projects:
+        filters = []
+        if not sub_tasks:
+            filters.append(('is_subtask_project', '=', False))
+        # Listing needs only id and name, read page by page
+        projects = client.iter_search_read(
+            'project.project', filters, fields_for('project.project', listing=True))
         for project in projects:
             click.echo(f'{project["id"]}\t{project["display_name"]}')
         return
-    if summary:
-        for project in projects:
-            # TODO change to single search for one project.
-            if project['id'] == int(summary):
-                print_project_page(client, project, 10)
+    if all_projects or ids:
+        filters = []
+        if ids:
+            filters.append(('id', 'in', [int(i) for i in ids.split(',')]))
+        elif not sub_tasks:
+            filters.append(('is_subtask_project', '=', False))
+        projects = client.iter_search_read('project.project', filters, fields_for('project.project'))
+        with Cache() as cache:
+            with Metadata(client, cache) as metadata:
+                stages = stage_map(metadata)
+            for path in write_project_pages(client, projects, output_dir, cache, jobs, stages):
+                click.echo(path)
+        return
+    project_id = int(summary or project)
+    found = client.search_read('project.project', [('id', '=', project_id)], fields_for('project.project'))
+    if not found:
+        click.echo(f'Project {project_id} not found')
         return
-    if project:
-        for pro in projects:
-            # TODO change to single search for one project.
-            if pro['id'] == int(project):
-                print_project_page(client, pro)
\ No newline at end of file
+    with Cache() as cache:
+        with Metadata(client, cache) as metadata:
+            stages = stage_map(metadata)
+        print_project_page(client, found[0], 10 if summary else None, cache, stages)
@@ -3,10 +3,59 @@ Wrapper for JSON settings
 """
 import os
 import json
+import time
 import click
 
 APP_NAME = 'Odoo Helper'
 
+# Seconds between config file mtime checks
+MTIME_CHECK_INTERVAL = 1.0
+
+# Parsed configs by file: path -> (mtime, checked, config)
+_configs = {}
+
+
+def config_file():
+    return os.environ.get(
+        'ODOO_CONFIG',
+        os.path.join(click.get_app_dir(APP_NAME), 'config.json')
+    )
+
+
+def socket_file():
+    """ Unix socket of background daemon """
+    return os.environ.get(
+        'ODOO_SOCKET',
+        os.path.join(click.get_app_dir(APP_NAME), 'daemon.sock')
+    )
+
+
+def get_config():
+    """
+    Return process wide parsed config. File is parsed again only
+    when its mtime changes and mtime is checked at most once per
+    MTIME_CHECK_INTERVAL. Returned dict is shared, do not modify it.
+    """
+    path = config_file()
+    now = time.monotonic()
+    cached = _configs.get(path)
+    if cached and now - cached[1] < MTIME_CHECK_INTERVAL:
+        return cached[2]
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        # Set default configs
+        mtime, config = None, {}
+    else:
+        if cached and cached[0] == mtime:
+            config = cached[2]
+        else:
+            with open(path, 'r') as f:
+                config = json.load(f)
+    _configs[path] = (mtime, now, config)
+    return config
+
+
 class Settings():
     """
     Settings wrapper
@@ -16,19 +65,8 @@ class Settings():
         self.config = {}
 
     def __enter__(self):
-        try:
-            config_file = os.environ.get(
-                'ODOO_CONFIG',
-                os.path.join(click.get_app_dir(APP_NAME), 'config.json')
-            )
-            with open(config_file, 'r') as f:
-                self.config = json.load(f)
-        except FileNotFoundError:
-
-            # Set default configs
-            self.config = {
-
-            }
+        # Copy so changes are not visible before save
+        self.config = dict(get_config())
         return self
 
     def __exit__(self, type, value, traceback):
@@ -44,15 +82,17 @@ class Settings():
     def __contains__(self, item):
         return item in self.config
 
+    def get(self, key, default=None):
+        return self.config.get(key, default)
+
     def save(self):
         """ Save new json """
-                # Save new values
-        config_file = os.environ.get(
-            'ODOO_CONFIG',
-            os.path.join(click.get_app_dir(APP_NAME), 'config.json')
-        )
+        # Save new values
+        path = config_file()
         # Try making dir if it does not exists
-        os.makedirs(click.get_app_dir(APP_NAME), exist_ok=True)
-        with open(config_file, 'w') as f:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
             json.dump(self.config, f)
+        # Next get_config parses saved file
+        _configs.pop(path, None)
 
@@ -1,22 +1,30 @@
+import heapq
 import os
 import sys
-import tempfile
 import datetime
-from subprocess import call
 
 import click
 
-import textile
-from odoohelper.client import Client
+from odoohelper.cache import Cache
+from odoohelper.client import Client, is_unreachable
+from odoohelper.fields import fields_for
+from odoohelper.metadata import Metadata, stage_map
 from odoohelper.settings import Settings
-from odoohelper.utils import check_config, get_pass, validate_odoo_date
+from odoohelper.utils import check_config, resolve_password, validate_odoo_date
 
-from .interactive import as_interactive
+from .interactive import TaskQueue, as_interactive
+from .priority import explain_task
 from .tasks import Task
 
+# Server side order for streamed tasks. Starred and nearest deadline first.
+STREAM_ORDER = 'priority desc, date_deadline, id'
+
 
 def create_message():
     """ Open editor """
+    import tempfile
+    from subprocess import call
+
     EDITOR = os.environ.get('EDITOR', 'vim')
     template = """Tehtävän kuvaus:
 
@@ -33,23 +41,73 @@ Mahdollinen muu tieto:
         tf.seek(0)
         message = tf.read()
     
+    import textile
     html = textile.textile(message.decode('utf-8'))
     return html
 
+def select_record(metadata, model, title, query=None, auto=False):
+    """
+    Prompt until user selects one record matching query. Names are
+    matched locally from metadata cache. With auto single or exact
+    match is selected without asking.
+    """
+    while True:
+        if not query:
+            query = click.prompt(title)
+        records = metadata.match(model, query)
+        exact = [r for r in records if r['display_name'].lower() == query.lower().strip()]
+        if auto and (len(records) == 1 or len(exact) == 1):
+            return records[0] if len(records) == 1 else exact[0]
+        for index, record in enumerate(records):
+            click.echo(f'[{index}] {record["display_name"]}')
+        click.echo(f'[s] Search again')
+        selection = click.prompt(f'Select {title.lower()}', default=0 if len(records) == 1 else None)
+        try:
+            return records[int(selection)]
+        except (ValueError, IndexError):
+            query = None
+
+def read_employee(client, cache):
+    """
+    Read own employee record to cache so the task tracked online can be
+    stopped offline. Returns records read.
+    """
+    employees = client.search_read(
+        'hr.employee', [('user_id', '=', client.user.id)], fields_for('hr.employee'))
+    cache.put('hr.employee', employees)
+    return employees
+
+
+def cached_current_task(cache, user_id):
+    """ Id of own task tracked when last online or None """
+    for employee in cache.all('hr.employee').values():
+        if employee['user_id'] and employee['user_id'][0] == user_id and employee['current_task']:
+            return employee['current_task'][0]
+    return None
+
+
+def forget_current_task(cache, user_id):
+    """ Mark cached employee as not tracking any task """
+    cache.put('hr.employee', [
+        dict(employee, current_task=False) for employee in cache.all('hr.employee').values()
+        if employee['user_id'] and employee['user_id'][0] == user_id
+    ])
+
+
 @click.group()
 def tasks_group():
     # Temp task group
     pass
 
 @tasks_group.command()
-@click.password_option(prompt=True if get_pass() is None else False, confirmation_prompt=False)
+@click.password_option(prompt=False, confirmation_prompt=False, callback=resolve_password)
 def instant(password):
     """ Start clocking on new task """
-    if password is None:
-        password = get_pass()
+    from openerp_proxy.exceptions import ConnectorError
+
     check_config()
     with Settings() as config:
-        client = Client(username=config['username'], password=password, database=config['database'], host=config['host'])
+        client = Client.from_config(config, password)
     client.connect()
 
     task = Task()
@@ -60,29 +118,59 @@ def instant(password):
     task.user_id = client.user.id
     ids = task.create(client)
     client.start_tracking([ids])
+    if client.offline:
+        click.echo('Server not reachable, run sync when online', file=sys.stderr)
+        return
+    with Cache() as cache:
+        try:
+            read_employee(client, cache)
+        except ConnectorError as error:
+            # Tracking started, only stopping offline needs the record
+            if not is_unreachable(error):
+                raise
 
 
 @tasks_group.command()
-@click.password_option(prompt=True if get_pass() is None else False, confirmation_prompt=False)
+@click.password_option(prompt=False, confirmation_prompt=False, callback=resolve_password)
 def stop(password):
     """ Stop clocking on previous task.
     If this is instance task then ask for more information """
-    if password is None:
-        password = get_pass()
+    from openerp_proxy.exceptions import ConnectorError
+
     check_config()
     with Settings() as config:
-        client = Client(username=config['username'], password=password, database=config['database'], host=config['host'])
+        client = Client.from_config(config, password)
     client.connect()
-    filters = [
-        ('user_id', '=', client.user.id),
-    ]
-    employee = client.search_read('hr.employee', filters)
-
-    if not employee[0]['current_task']:
-        click.echo('Nothing to show. Exiting..')
-        return
-    ids = employee[0]['current_task'][0]
-    client.terminate_tracking([ids])
+    with Cache() as cache:
+        employee = None
+        if not client.offline:
+            try:
+                employee = read_employee(client, cache)
+            except ConnectorError as error:
+                if not is_unreachable(error):
+                    raise
+                client.offline = True
+        if client.offline:
+            # Newest task started offline is the current one, else the one
+            # tracked when last online
+            started = client.operation_log().last_started()
+            if not started:
+                current = cached_current_task(cache, client.user.id)
+                started = [current] if current else None
+            if not started:
+                click.echo('Nothing to show. Exiting..')
+                return
+            client.terminate_tracking(started)
+            forget_current_task(cache, client.user.id)
+            click.echo('Server not reachable, run sync when online', file=sys.stderr)
+            return
+
+        if not employee[0]['current_task']:
+            click.echo('Nothing to show. Exiting..')
+            return
+        ids = employee[0]['current_task'][0]
+        client.terminate_tracking([ids])
+        forget_current_task(cache, client.user.id)
     task = Task()
     task.id = ids
     click.launch(task.url())
@@ -90,90 +178,54 @@ def stop(password):
 
 
 @tasks_group.command()
-@click.password_option(prompt=True if get_pass() is None else False, confirmation_prompt=False)
+@click.password_option(prompt=False, confirmation_prompt=False, callback=resolve_password)
 @click.option('-t', '--title', metavar='<title>', help='Task title', prompt=True)
 def create(password, title):
     """ Create new task """
-    if password is None:
-        password = get_pass()
     check_config()
     with Settings() as config:
-        client = Client(username=config['username'], password=password, database=config['database'], host=config['host'])
+        client = Client.from_config(config, password)
 
     client.connect()
     message = create_message()
 
-    selected_project = None
-    while not selected_project:
-        project = click.prompt('Project')
-        filters = []
-        filters.append(('is_subtask_project', '=', False))
-        filters.append(('name', 'ilike', project))
-        projects = client.search_read('project.project', filters)
-        for index, project_data in enumerate(projects):
-            click.echo(f'[{index}] {project_data["display_name"]}')
-        click.echo(f'[s] Search again')
-        if len(projects) == 1:
-            selection = click.prompt('Select project', default=0)
-        else:
-            selection = click.prompt('Select project')
-        try: 
-            selected = int(selection)
-            selected_project = projects[selected]
-        except:
-            pass
+    with Cache() as cache, Metadata(client, cache) as metadata:
+        selected_project = select_record(metadata, 'project.project', 'Project')
+        selected_user = select_record(metadata, 'res.users', 'User')
+        inbox = stage_map(metadata)['inbox'][0]
     task = Task()
     task.name = title
     task.description = message
     task.project_id = selected_project['id']
-
-    selected_user = None
-    while not selected_user:
-        user = click.prompt('User')
-        filters = []
-    
-        filters.append(('name', 'ilike', user))
-        users = client.search_read('res.users', filters)
-        for index, user_data in enumerate(users):
-            click.echo(f'[{index}] {user_data["name"]}')
-        click.echo(f'[s] Search again')
-        if len(users) == 1:
-            selection = click.prompt('Select user', default=0)
-        else:
-            selection = click.prompt('Select user')
-        try: 
-            selected = int(selection)
-            selected_user = users[selected]
-        except:
-            pass
-            
-    
     task.user_id = selected_user['id']
 
-    task.create(client)
+    task.create(client, inbox)
     click.echo(task.url())
     input('Press Enter to continue...')
 
 
 @tasks_group.command()
-@click.password_option(prompt=True if get_pass() is None else False, confirmation_prompt=False)
+@click.password_option(prompt=False, confirmation_prompt=False, callback=resolve_password)
+@click.option('--messages', help="Index message bodies too (use with --reindex)", is_flag=True)
+@click.option('--reindex', help="Build local search index again", is_flag=True)
 @click.argument('search-term', required=False)
-def search(password, search_term):
-    """Return tasks in priority order.
+def search(password, search_term, messages=False, reindex=False):
+    """Search tasks by words in name, description or messages.
 
-    Default is to find your tasks. This can also be used
-    to fetch tasks by user.
+    Local search index is updated with changed tasks and results
+    are ranked best first. Words match also as prefixes.
     """
-    if password is None:
-        password = get_pass()
     check_config()
     with Settings() as config:
-        client = Client(username=config['username'], password=password, database=config['database'], host=config['host'])
+        client = Client.from_config(config, password)
     client.connect()
     if not search_term:
         search_term = click.prompt('Search')
 
-    tasks = Task.search(client, search_term)
+    with Cache() as cache:
+        if reindex and cache.fts:
+            cache.clear_index()
+        tasks = Task.search(client, search_term, cache, messages)
     if len(tasks) != 0:
         click.echo(click.style(Task().print_topic('terminal'), fg='blue'))
         for task in tasks:
@@ -185,53 +237,39 @@ def search(password, search_term):
 
 
 @tasks_group.command()
-@click.password_option(prompt=True if get_pass() is None else False, confirmation_prompt=False)
+@click.password_option(prompt=False, confirmation_prompt=False, callback=resolve_password)
 @click.option('-u','--user', metavar='<user full name>', help="User display name in Odoo")
 @click.option('-i','--interactive', help="Ask what you want to do on each task", is_flag=True)
 @click.option('-l','--list-tasks', help="List tasks", is_flag=True)
 @click.option('-f', '--print-format', metavar='<format>', help='format return data as csv or md (markdown) (not interactive)', default='csv')
 @click.option('--start', metavar='<start date>', callback=validate_odoo_date, help="Show active tasks from date")
 @click.option('--end', metavar='<end date>', callback=validate_odoo_date, help="Show active tasks up to date")
-def tasks(password, user, interactive, list_tasks, print_format, start=None, end=None):
+@click.option('--stream', help="Print tasks as they arrive in server order (star, deadline), not by priority (not interactive)", is_flag=True)
+@click.option('-n', '--limit', metavar='<N>', type=int, help="Only N highest priority tasks, with --stream first N in server order")
+@click.option('--explain', help="Show how each priority rule contributed (not interactive)", is_flag=True)
+@click.option('--mark-done', help="Mark all listed tasks as done", is_flag=True)
+@click.option('--shift-deadlines', metavar='<days>', type=int, help="Move deadlines of listed tasks by days")
+def tasks(password, user, interactive, list_tasks, print_format, start=None, end=None, stream=False, limit=None, explain=False, mark_done=False, shift_deadlines=None):
     """Return tasks in priority order.
 
     Default is to find your tasks. This can also be used
     to fetch tasks by user.
     """
-    if password is None:
-        password = get_pass()
     check_config()
     with Settings() as config:
-        client = Client(username=config['username'], password=password, database=config['database'], host=config['host'])
+        client = Client.from_config(config, password)
 
     client.connect()
     click.echo('Fetching tasks from ODOO... This may take a while.', file=sys.stderr)
-    if not user:
-        user_id = client.user.id
-    else:
-        selected_user = None
-        while not selected_user:
-            filters = []
-        
-            filters.append(('name', 'ilike', user))
-            users = client.search_read('res.users', filters)
-
-            if len(users) == 1:
-                selection = 0
-            else:
-                for index, user_data in enumerate(users):
-                    click.echo(f'[{index}] {user_data["name"]}')
-                click.echo(f'[s] Search again')
-                selection = click.prompt('Select user')
-            try: 
-                selected = int(selection)
-                selected_user = users[selected]
-            except:
-                user = click.prompt('User')
-        user_id = selected_user['id']
+    with Cache() as cache, Metadata(client, cache) as metadata:
+        if not user:
+            user_id = client.user.id
+        else:
+            user_id = select_record(metadata, 'res.users', 'User', user, auto=True)['id']
+        stages = stage_map(metadata)
     filters = [
         ('user_id', '=', user_id),
-        ('stage_id', '!=', 8),  # This is done stage. Should be in config?
+        ('stage_id', 'not in', stages['done']),
     ]
 
     if start:
@@ -239,26 +277,58 @@ def tasks(password, user, interactive, list_tasks, print_format, start=None, end
     if end:
         filters.append(('date_deadline', "<=", end.strftime('%Y-%m-%d 23:59:00')))
 
-    all_tasks = Task.fetch_tasks(client, filters)
-    all_sorted = sorted(all_tasks, key=lambda x: x.priority, reverse=True)
+    if stream and not interactive and not client.offline:
+        click.echo(Task.print_topic(print_format))
+        for index, task in enumerate(Task.iter_tasks(client, filters, order=STREAM_ORDER)):
+            if limit and index >= limit:
+                break
+            click.echo(task.as_formatted(print_format))
+        return
+
+    if limit and not client.offline:
+        # Keep only limit tasks in memory while pages arrive
+        all_sorted = heapq.nlargest(limit, Task.iter_tasks(client, filters), key=lambda x: x.priority)
+    else:
+        with Cache() as cache:
+            # Highest priority first, from cached priorities with limit
+            all_sorted = Task.fetch_tasks(client, filters, cache, limit)
+    if mark_done or shift_deadlines:
+        for task in all_sorted:
+            if shift_deadlines:
+                task.shift_deadline(shift_deadlines)
+            if mark_done:
+                task.mark_done(stages['done'][0])
+        changed = [task for task in all_sorted if task.dirty]
+        if not changed or not click.confirm(f'Write changes to {len(changed)} tasks?'):
+            return
+        # Tasks with identical changes share one write
+        written = Task.commit(client, changed)
+        click.echo(f'{len(written)} tasks written', file=sys.stderr)
+        return
     if not interactive:
         click.echo(Task.print_topic(print_format))
         for task in all_sorted:
             click.echo(task.as_formatted(print_format))
+            if explain:
+                for name, weight in explain_task(task):
+                    if weight:
+                        click.echo(f'    {weight:+}\t{name}')
     else:
+        queue = TaskQueue(client, all_sorted)
         current_index = 0
         # Loop with index as interactive can go both ways
         while True:
-            task = all_sorted[current_index]
+            task = queue.current(current_index)
             index_mod = as_interactive(
                 client=client,
                 task=task,
-                task_count=len(all_sorted),
-                current_index=current_index)
+                task_count=len(queue),
+                current_index=current_index,
+                queue=queue)
             new_index = current_index + index_mod
 
             current_index = new_index
-            if current_index >= len(all_sorted):
+            if current_index >= len(queue):
                 current_index = 0
             if current_index < 0:
-                current_index = len(all_sorted) - 1
+                current_index = len(queue) - 1
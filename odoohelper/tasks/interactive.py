@@ -5,10 +5,86 @@ from collections import namedtuple
 
 import click
 
+from odoohelper.cache import Cache
+from odoohelper.fields import fields_for
+from odoohelper.metadata import Metadata, stage_map
 from odoohelper.tasks import Task
 
+from .priority import score_tasks
+
 Action = namedtuple('Action', ['key', 'description', 'action_func'])
-Reaction = namedtuple('Reaction', ['cont', 'index'])
+# changed tells that action wrote task to server
+Reaction = namedtuple('Reaction', ['cont', 'index', 'changed'], defaults=(False,))
+
+
+class TaskQueue():
+    """
+    Local model of interactive task queue.
+    Tasks are re-read only after a write or when their write_date
+    has changed in server. Previous and next tasks are checked in
+    background while current task is shown.
+    """
+
+    def __init__(self, client, tasks):
+        self.client = client
+        self.tasks = tasks
+        self.pending = None
+        self.reported = False  # Failed background check was reported
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def current(self, index):
+        """ Return task at index and start checking its neighbours """
+        self.wait()
+        neighbours = {self.tasks[(index + step) % len(self.tasks)] for step in (-1, 1)}
+        neighbours.discard(self.tasks[index])
+        if neighbours:
+            self.pending = self.client.submit(self.refresh, list(neighbours))
+        return self.tasks[index]
+
+    def wait(self):
+        """
+        Wait for background check so tasks are not changed while shown.
+        Failed check keeps shown tasks, the error is reported once.
+        """
+        from openerp_proxy.exceptions import ConnectorError
+
+        if self.pending is not None:
+            pending, self.pending = self.pending, None
+            try:
+                pending.result()
+            except ConnectorError as error:
+                if not self.reported:
+                    click.echo(f'Could not check tasks for changes: {error}', err=True)
+                    self.reported = True
+
+    def refresh(self, tasks):
+        """ Reload tasks whose write_date has changed. Returns reloaded tasks. """
+        if not tasks or self.client.offline:
+            return []
+        by_id = {task.id: task for task in tasks}
+        rows = self.client.search_read('project.task', [('id', 'in', list(by_id))], ['write_date'])
+        changed = [by_id[row['id']] for row in rows if row['write_date'] != by_id[row['id']].write_date]
+        return self.reload(changed)
+
+    def reload(self, tasks):
+        """ Read tasks and their messages with one call per model """
+        if not tasks or self.client.offline:
+            return []
+        by_id = {task.id: task for task in tasks}
+        tasks_data = self.client.search_read(
+            'project.task', [('id', 'in', list(by_id))], fields_for('project.task'))
+        Task.fetch_messages(self.client, tasks_data)
+        for task_data in tasks_data:
+            by_id[task_data['id']].setup(task_data, score=False)
+        return score_tasks(tasks)
+
+    def written(self, task):
+        """ Task was written, read it back """
+        self.wait()
+        self.reload([task])
+
 
 def open_in_browser(client, task):
     click.launch(task.url())
@@ -17,15 +93,18 @@ def open_in_browser(client, task):
 def change_deadline(client, task):
     deadline = click.prompt("Add deadline (YYYY-MM-DD)")
     if len(deadline) != 0:
-        task.update(client, 'date_deadline', deadline)
-        task.update(client, 'date_end', f'{deadline} 22:00:00')
+        task.set_deadline(deadline)
+        return Reaction(True, None, task.flush(client))
     return Reaction(True, None)
 
 def change_startdate(client, task):
     return Reaction(True, None)
 
 def mark_as_done(client, task):
-    return Reaction(True, None)
+    # Done task leaves the queue view, continue to next one
+    with Cache() as cache, Metadata(client, cache) as metadata:
+        task.mark_done(stage_map(metadata)['done'][0])
+    return Reaction(False, 1, task.flush(client))
 
 def next_task(client, task):
     # Return from task view and advance index by 1
@@ -59,9 +138,10 @@ def print_task(task):
     else:
         print_data('Deadline', str(task.deadline)) # Timezone conversion missing
 
-def as_interactive(client: any, task: Task, task_count: int, current_index: int):
+def as_interactive(client: any, task: Task, task_count: int, current_index: int, queue: TaskQueue = None):
     """
-    Handle interactive task here
+    Handle interactive task here. Task is shown as it is and read
+    again only after an action has written it.
     """
     actions = [
         Action(('1',), 'Open in browser', open_in_browser),
@@ -79,8 +159,6 @@ def as_interactive(client: any, task: Task, task_count: int, current_index: int)
 
     # Loop around one task until ctrl+c or enter is given
     while True:
-        # Reload task here.
-        task.reload(client)
         click.clear()
         print_data('Current queue', f'{current_index+1}/{task_count}')
         print_task(task)
@@ -93,5 +171,10 @@ def as_interactive(client: any, task: Task, task_count: int, current_index: int)
             continue
         # Action func should return false if this task is done
         reaction = act.action_func(client, task)
+        if reaction.changed:
+            if queue is not None:
+                queue.written(task)
+            else:
+                task.reload(client)
         if not reaction.cont:
             return reaction.index
@@ -0,0 +1,208 @@
+"""
+Batch priority scoring for tasks.
+
+Priority is a sum of rules. Rules come from "priority_rules" in config
+and default to the weights of Task.calculate_priority. Rules are
+compiled once into a Python function that scores columns of many
+tasks against a single reference time.
+
+Priority depends on time only through whole days to deadline or since
+newest message. Each score has a time it is valid until so it can be
+cached and is computed again only after that time or when task changes.
+"""
+import calendar
+import hashlib
+import json
+import math
+from collections import namedtuple
+from datetime import datetime
+
+from odoohelper.settings import get_config
+
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1000000
+
+# Valid until value of priorities that do not change with time
+FOREVER = 2 ** 62
+
+DEFAULT_RULES = [
+    {'name': 'Marked with star', 'type': 'star', 'weight': 40},
+    {'name': 'Deadline passed', 'type': 'deadline', 'missing': 1000, 'passed': 3000, 'weight': 300, 'max_days': 100},
+    {'name': 'Check for blocking', 'type': 'blocked', 'per_day': 5},
+    {'name': 'Check that planned hours is set', 'type': 'planned_hours', 'weight': 50},
+    {'name': 'Check that gantt is set', 'type': 'gantt', 'weight': 50},
+]
+
+# Epoch values are integer seconds or None when missing
+Columns = namedtuple('Columns', [
+    'marked_priority',
+    'deadline',
+    'blocked',
+    'newest_message_date',
+    'planned_hours',
+    'start_date',
+    'end_date',
+    'stage',
+    'project_id',
+])
+
+Scorer = namedtuple('Scorer', ['names', 'score_columns', 'explain', 'until_columns', 'fingerprint'])
+
+
+def number(rule, key, default=None):
+    """ Rule parameter as int or float literal """
+    value = rule.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f'Priority rule "{rule.get("name")}" needs number {key}')
+    return repr(value)
+
+
+def rule_expression(index, rule, namespace):
+    """
+    Return Python expression for rule. Values used by expression are
+    added to namespace.
+    """
+    rule_type = rule.get('type')
+    if rule_type == 'star':
+        return f'({number(rule, "weight")} if star else 0)'
+    if rule_type == 'deadline':
+        max_days = int(number(rule, 'max_days', 100))
+        weight = float(number(rule, 'weight'))
+        namespace[f'decay_{index}'] = [int(math.pow(0.5, days) * weight) for days in range(max_days + 1)]
+        return (
+            f'({number(rule, "missing")} if deadline is None '
+            f'else {number(rule, "passed")} if deadline * 1000000 <= now_us '
+            f'else decay_{index}[min((deadline * 1000000 - now_us) // DAY, {max_days})])'
+        )
+    if rule_type == 'blocked':
+        return f'({number(rule, "per_day")} * ((now_us - newest * 1000000) // DAY) if blocked else 0)'
+    if rule_type == 'planned_hours':
+        return f'(0 if planned > 0 else {number(rule, "weight")})'
+    if rule_type == 'gantt':
+        return f'({number(rule, "weight")} if start is None or end is None else 0)'
+    if rule_type in ('stage', 'project'):
+        # Match by id or name
+        namespace[f'values_{index}'] = frozenset(rule.get('values', []))
+        column = 'stage' if rule_type == 'stage' else 'project'
+        return (
+            f'({number(rule, "weight")} if {column} and '
+            f'({column}[0] in values_{index} or {column}[1] in values_{index}) else 0)'
+        )
+    raise ValueError(f'Unknown priority rule type: {rule_type}')
+
+
+def until_expression(rule):
+    """
+    Return Python expression for first time in microseconds when rule
+    may give another value, or None if rule does not depend on time.
+    """
+    rule_type = rule.get('type')
+    if rule_type == 'deadline':
+        max_days = int(number(rule, 'max_days', 100))
+        # Days to deadline drop just after whole days are left, passed at deadline
+        return (
+            f'(FOREVER if deadline is None or deadline * 1000000 <= now_us '
+            f'else deadline * 1000000 - min((deadline * 1000000 - now_us) // DAY, {max_days}) * DAY '
+            f'+ (1 if deadline * 1000000 - now_us >= DAY else 0))'
+        )
+    if rule_type == 'blocked':
+        return '(newest * 1000000 + ((now_us - newest * 1000000) // DAY + 1) * DAY if blocked else FOREVER)'
+    return None
+
+
+def compile_rules(rules):
+    """
+    Compile rules to Scorer. score_columns(cols, now_us) returns list of
+    priorities, until_columns(cols, now_us) list of times they are valid
+    until and explain(now_us, *row) returns contribution of each rule.
+    """
+    namespace = {'DAY': MICROSECONDS_PER_DAY, 'FOREVER': FOREVER}
+    expressions = [rule_expression(index, rule, namespace) for index, rule in enumerate(rules)]
+    untils = [expression for expression in map(until_expression, rules) if expression]
+    row = 'star, deadline, blocked, newest, planned, start, end, stage, project'
+    source = (
+        'def score_columns(cols, now_us):\n'
+        '    scores = []\n'
+        '    append = scores.append\n'
+        f'    for {row} in zip(*cols):\n'
+        f'        append({" + ".join(expressions) or "0"})\n'
+        '    return scores\n'
+        '\n'
+        'def until_columns(cols, now_us):\n'
+        '    untils = []\n'
+        '    append = untils.append\n'
+        f'    for {row} in zip(*cols):\n'
+        f'        append(min({", ".join(untils + ["FOREVER"])}))\n'
+        '    return untils\n'
+        '\n'
+        f'def explain(now_us, {row}):\n'
+        f'    return ({"".join(e + ", " for e in expressions)})\n'
+    )
+    exec(compile(source, '<priority rules>', 'exec'), namespace)
+    names = [rule.get('name', rule['type']) for rule in rules]
+    # Cached priorities are valid only for same rules
+    fingerprint = hashlib.sha1(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()
+    return Scorer(
+        names, namespace['score_columns'], namespace['explain'], namespace['until_columns'], fingerprint)
+
+
+_scorers = {}
+
+
+def get_scorer():
+    """ Scorer for configured rules. Compiled once per rule set. """
+    rules = get_config().get('priority_rules', DEFAULT_RULES)
+    key = json.dumps(rules, sort_keys=True)
+    if key not in _scorers:
+        _scorers[key] = compile_rules(rules)
+    return _scorers[key]
+
+
+def columns(tasks):
+    """ Return columnar view of tasks """
+    return Columns(
+        marked_priority=[task.marked_priority for task in tasks],
+        deadline=[task._deadline for task in tasks],
+        blocked=[task.blocked for task in tasks],
+        newest_message_date=[task._newest_message_date for task in tasks],
+        planned_hours=[task.planned_hours for task in tasks],
+        start_date=[task._start_date for task in tasks],
+        end_date=[task._end_date for task in tasks],
+        stage=[task.stage for task in tasks],
+        project_id=[task.project_id for task in tasks],
+    )
+
+
+def now_microseconds(now=None):
+    if now is None:
+        now = datetime.now()
+    # Integer microseconds keep day differences exact like timedelta.days
+    return calendar.timegm(now.timetuple()) * 1000000 + now.microsecond
+
+
+def score_columns(cols, now=None, scorer=None):
+    """
+    Return list of priorities for columns. All tasks are scored against
+    the same now.
+    """
+    scorer = scorer or get_scorer()
+    return scorer.score_columns(cols, now_microseconds(now))
+
+
+def score_tasks(tasks, now=None, scorer=None):
+    """ Set priority of each task in one pass and return tasks """
+    for task, score in zip(tasks, score_columns(columns(tasks), now, scorer)):
+        task.priority = score
+    return tasks
+
+
+def valid_until(tasks, now=None, scorer=None):
+    """ Return time in microseconds until which priority of each task stays same """
+    scorer = scorer or get_scorer()
+    return scorer.until_columns(columns(tasks), now_microseconds(now))
+
+
+def explain_task(task, now=None, scorer=None):
+    """ Return list of (rule name, contribution) for task """
+    scorer = scorer or get_scorer()
+    row = [column[0] for column in columns([task])]
+    return list(zip(scorer.names, scorer.explain(now_microseconds(now), *row)))
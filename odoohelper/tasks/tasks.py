@@ -1,42 +1,153 @@
 """
 Odoo tasks
 """
+import functools
+import heapq
+import html
+import itertools
+import json
 import math
+import re
+import sys
 from datetime import datetime, timedelta
-from odoohelper.settings import Settings
+from odoohelper.cache import INDEX_MODEL, match_domain
+from odoohelper.fields import fields_for
+from odoohelper.metadata import stage_map
+from odoohelper.settings import get_config
+
+from .priority import get_scorer, now_microseconds, score_tasks, valid_until
+
+# Max amount of ids sent in one mail.message read
+MESSAGE_CHUNK_SIZE = 1000
+
+# Tasks per page in iter_tasks
+PAGE_SIZE = 200
+
+
+def html_text(value):
+    """ Plain text of Odoo HTML field for indexing """
+    if not value:
+        return ''
+    return html.unescape(re.sub(r'<[^>]+>', ' ', value))
+
+
+@functools.lru_cache(maxsize=None)
+def url_template(host):
+    """ Task url template for host. Format with task id. """
+    return f'https://{host}/web#id={{}}&view_type=form&model=project.task&menu_id=93&action=143'
+
+# Missing dates are stored as None
+EPOCH = datetime(1970, 1, 1)
+
+# Shared (id, name) pairs so tasks in same stage or project reuse one tuple
+_pairs = {}
+
+
+def shared_pair(value):
+    """ Return canonical tuple for Odoo many2one value. False stays False. """
+    if not value:
+        return value
+    pair = (value[0], sys.intern(value[1]))
+    return _pairs.setdefault(pair, pair)
+
+
+def to_epoch(date):
+    if not date:
+        return None
+    return int((date - EPOCH).total_seconds())
+
+
+def from_epoch(seconds):
+    if seconds is None:
+        return False
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class EpochDate():
+    """
+    Datetime attribute stored as integer epoch seconds in a slot.
+    Reads return naive datetime or False like Odoo.
+    """
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return from_epoch(getattr(instance, self.slot))
+
+    def __set__(self, instance, value):
+        setattr(instance, self.slot, to_epoch(value))
+
 
 class Task():
     """
     Wrapper for Odoo task
     """
-    def __init__(self):
+    __slots__ = (
+        'id',
+        'name',
+        'stage',
+        'user_id',
+        'project_id',
+        'project',
+        '_description',
+        '_deadline',
+        '_create_date',
+        '_start_date',
+        '_end_date',
+        '_newest_message_date',
+        'blocked',
+        'planned_hours',
+        'marked_priority',
+        'priority',
+        'write_date',
+        '_dirty',
+        'get_current_time',
+    )
+
+    deadline = EpochDate('_deadline')
+    create_date = EpochDate('_create_date')
+    start_date = EpochDate('_start_date')
+    end_date = EpochDate('_end_date')
+    newest_message_date = EpochDate('_newest_message_date')
+
+    def __init__(self, task_data=None):
         self.id = -1
+        self._description = None
+        self.write_date = None
+        # Changed fields waiting for flush. None until first change.
+        self._dirty = None
+        # Wrap datetime.now for easier mocking in tests
+        self.get_current_time = datetime.now
+        if task_data is not None:
+            self.setup(task_data)
 
-    def setup(self, task_data):
+    def setup(self, task_data, score=True):
         """
-        Setup values from raw json task.
+        Setup values from raw json task. With score=False priority is
+        left for score_tasks to set for many tasks at once.
         """
         self.id = task_data['id']
         self.name = task_data['name']
-        self.stage = task_data['stage_id']
-        self.description = task_data['description']
-        self.user_id = task_data['user_id']
-        self.project_id = task_data['project_id']
-        self.project = task_data.get('full_project_name', 'Not assigned to project')
+        self.stage = shared_pair(task_data['stage_id'])
+        # Description is not read with task lists, see load_description
+        self._description = task_data.get('description')
+        self.user_id = shared_pair(task_data.get('user_id', False))
+        self.project_id = shared_pair(task_data.get('project_id', False))
+        self.project = sys.intern(task_data.get('full_project_name', 'Not assigned to project'))
         # All dates and times should be in UTC. Only print and input with local time
-        self.deadline = self.date_or_bool(task_data['date_deadline'], '%Y-%m-%d')
+        self.deadline = self.date_or_bool(task_data['date_deadline'])
         # Padd deadline to 12:00:00 for clarity
         if self.deadline:
             self.deadline += timedelta(hours=12)
-        self.assigned = task_data['user_id']
-        self.create_date = self.date_or_bool(task_data['create_date'], '%Y-%m-%d %H:%M:%S')
-        self.start_date = self.date_or_bool(task_data['date_start'], '%Y-%m-%d %H:%M:%S')
-        self.end_date = self.date_or_bool(task_data['date_end'], '%Y-%m-%d %H:%M:%S')
+        self.create_date = self.date_or_bool(task_data.get('create_date', False))
+        self.start_date = self.date_or_bool(task_data['date_start'])
+        self.end_date = self.date_or_bool(task_data['date_end'])
         try:
-            self.newest_message_date = max(
-                datetime.strptime(
-                    d['date'], '%Y-%m-%d %H:%M:%S'
-                ) for d in task_data['partial_messages']
+            # Odoo date strings sort like dates so only newest is parsed
+            self.newest_message_date = datetime.fromisoformat(
+                max(d['date'] for d in task_data['partial_messages'])
             )
         except ValueError:
             # If there is no messages in task then just set message date now()
@@ -44,7 +155,30 @@ class Task():
         self.blocked = task_data['kanban_state'] == 'blocked'
         self.planned_hours = task_data['planned_hours']
         self.marked_priority = task_data['priority'] == '1'
-        self.priority = self.calculate_priority()
+        self.priority = 0
+        # Raw server value, only compared to detect changes
+        self.write_date = task_data.get('write_date')
+        if score:
+            score_tasks([self], self.get_current_time())
+
+    @property
+    def assigned(self):
+        return self.user_id
+
+    @property
+    def description(self):
+        """ HTML description. None until set or loaded. """
+        return self._description
+
+    @description.setter
+    def description(self, value):
+        self._description = value
+
+    def load_description(self, client):
+        """ Read HTML description from server when it is needed """
+        if self._description is None:
+            self._description = client.read('project.task', self.id, ['description'])['description']
+        return self._description
 
     def start(self):
         start = None
@@ -116,21 +250,17 @@ class Task():
         return f'{self.priority}\t{self.stage[1]}\t{self.deadline}\t{self.name}'
 
     @classmethod
-    def date_or_bool(cls, datestr, dateformat):
-        try:
-            return datetime.strptime(datestr, dateformat)
-        except TypeError:
+    def date_or_bool(cls, datestr):
+        """ Parse Odoo date or datetime string. False stays False. """
+        if not datestr:
             return False
-
-    def get_current_time(self):
-        """
-        Wrap datetime.now for easier mocking in tests
-        """
-        return datetime.now()
+        # Odoo sends ISO format, parsed much faster than with strptime
+        return datetime.fromisoformat(datestr)
 
     def calculate_priority(self):
         """
-        Calculate priority for task
+        Calculate priority for task with default weights.
+        Rules from config are applied by score_tasks.
         """
         weight_table = [
             ('Marked with star', self.priority_check_star),
@@ -192,20 +322,72 @@ class Task():
 
     def url(self):
         """Return task url in host"""
-        with Settings() as settings:
-            return f'https://{settings["host"]}/web#id={self.id}&view_type=form&model=project.task&menu_id=93&action=143'
+        return url_template(get_config()['host']).format(self.id)
 
     def reload(self, client):
         """Reload task infromation."""
-        task_data = client.read('project.task', self.id)
-        task_data['partial_messages'] = client.read('mail.message', task_data['message_ids'], ['date', 'description'])
+        task_data = client.read('project.task', self.id, fields_for('project.task'))
+        Task.fetch_messages(client, [task_data])
         self.setup(task_data)
 
     def update(self, client, field, value):
-        client.write('project.task', self.id, {field: value})
+        """ Write one field now """
+        self.set_value(field, value)
+        self.flush(client)
+
+    def set_value(self, field, value):
+        """ Change field value. Written to server with flush or commit. """
+        if self._dirty is None:
+            self._dirty = {}
+        self._dirty[field] = value
+
+    @property
+    def dirty(self):
+        """ Changed fields not yet written """
+        return dict(self._dirty or {})
+
+    def flush(self, client):
+        """ Write all changed fields with one call. Returns True if written. """
+        return bool(Task.commit(client, [self]))
+
+    def set_deadline(self, deadline):
+        """ Change deadline (YYYY-MM-DD). Gantt end follows deadline. """
+        self.set_value('date_deadline', deadline)
+        self.set_value('date_end', f'{deadline} 22:00:00')
+
+    def shift_deadline(self, days):
+        """ Move deadline by days. Tasks without deadline are not changed. """
+        if self.deadline:
+            self.set_deadline((self.deadline + timedelta(days=days)).strftime('%Y-%m-%d'))
+
+    def mark_done(self, stage_id=None):
+        """ Move task to stage_id or first configured done stage """
+        self.set_value('stage_id', stage_id or stage_map()['done'][0])
+
+    @staticmethod
+    def commit(client, tasks):
+        """
+        Write changed fields of tasks. Tasks with identical changes are
+        written with one call. Returns list of written tasks.
+        """
+        groups = {}
+        for task in tasks:
+            if task._dirty:
+                # Values may be lists (many2many commands) so key by json
+                key = json.dumps(task._dirty, sort_keys=True)
+                groups.setdefault(key, (task._dirty, []))[1].append(task)
+        written = []
+        for vals, group in groups.values():
+            client.write(
+                'project.task', [task.id for task in group], vals,
+                write_dates={task.id: task.write_date for task in group})
+            for task in group:
+                task._dirty = None
+            written.extend(group)
+        return written
 
-    def create(self, client):
-        """ Create task """
+    def create(self, client, stage_id=None):
+        """ Create task to stage_id or first configured inbox stage """
         args = {
             'name': self.name,
             'description': self.description,
@@ -213,34 +395,273 @@ class Task():
             'legend_blocked': False,
             'legend_normal': False,
             'user_id': self.user_id,
-            'stage_id': 14  # Inbox  
+            'stage_id': stage_id or stage_map()['inbox'][0]
         }
         self.id = client.create('project.task', args)
         return self.id
 
     @staticmethod
-    def fetch_tasks(client, filters):
+    def fetch_messages(client, tasks_data, fields=None):
+        """
+        Fill partial_messages for each raw task in tasks_data.
+        Messages for all tasks are read with chunked calls and joined
+        back to tasks in memory so round trips don't grow with task count.
+        Only message date is read unless fields are given.
+        """
+        message_task = {}
+        for task in tasks_data:
+            task['partial_messages'] = []
+            for message_id in task['message_ids']:
+                message_task[message_id] = task
+        message_ids = list(message_task)
+        for index in range(0, len(message_ids), MESSAGE_CHUNK_SIZE):
+            chunk = message_ids[index:index + MESSAGE_CHUNK_SIZE]
+            # Read only partial data to messages
+            for message in client.read('mail.message', chunk, fields or fields_for('mail.message')):
+                message_task[message['id']]['partial_messages'].append(message)
+        return tasks_data
+
+    @staticmethod
+    def fetch_tasks(client, filters, cache=None, limit=None):
         """
         Fetch tasks using client and filters.
         Each task will also find messages for it self for
-        futher analytics. This can be slow process so it should be saved
-        to some cache after fetching.
+        futher analytics. With cache only tasks changed since last
+        sync are read from server and tasks are returned highest
+        priority first, at most limit.
+        """
+        if cache is None:
+            return list(Task.iter_tasks(client, filters))
+        if not client.offline:
+            # New messages do not change write_date of cached tasks
+            Task.sync_messages(client, cache)
+        return Task.rank(Task.sync_tasks(client, filters, cache), cache, limit)
+
+    @staticmethod
+    def rank(tasks_data, cache, limit=None, now=None):
+        """
+        Return tasks for raw tasks data highest priority first. Full
+        listings set up every task anyway and scoring them is faster
+        than reading cached priorities. With limit valid priorities are
+        read from cache so only changed tasks and tasks whose priority
+        has expired are set up and scored, and tasks past limit are not
+        set up.
+        """
+        scorer = get_scorer()
+        now = now or datetime.now()
+        if limit is None:
+            tasks = []
+            for task_data in tasks_data:
+                task = Task()
+                task.setup(task_data, score=False)
+                tasks.append(task)
+            return sorted(score_tasks(tasks, now, scorer), key=lambda task: (-task.priority, task.id))
+        by_id = {task['id']: task for task in tasks_data}
+        cached = cache.priorities(by_id, scorer.fingerprint, now_microseconds(now))
+        stale = {}
+        for task_id, task_data in by_id.items():
+            if task_id not in cached:
+                stale[task_id] = Task()
+                stale[task_id].setup(task_data, score=False)
+        if stale:
+            scored = score_tasks(list(stale.values()), now, scorer)
+            cache.set_priorities(
+                [(task.id, task.priority, until) for task, until in zip(scored, valid_until(scored, now, scorer))],
+                scorer.fingerprint)
+        # Cached priorities come in order already
+        ranked = heapq.merge(
+            cached.items(),
+            sorted(((task.id, task.priority) for task in stale.values()), key=lambda item: (-item[1], item[0])),
+            key=lambda item: (-item[1], item[0]))
+        final_task_list = []
+        for task_id, priority in itertools.islice(ranked, limit):
+            task = stale.get(task_id)
+            if task is None:
+                task = Task()
+                task.setup(by_id[task_id], score=False)
+                task.priority = priority
+            final_task_list.append(task)
+        return final_task_list
+
+    @staticmethod
+    def iter_tasks(client, filters, order='id', page_size=PAGE_SIZE):
         """
-        task_ids = client.search('project.task', filters)
-        # Fetch data for task_ids
-        tasks_data = client.read('project.task', task_ids)
+        Yield tasks page by page. Messages are read once per page.
+        """
+        page = []
+        records = client.iter_search_read(
+            'project.task', filters, fields_for('project.task'), order=order, page_size=page_size)
+        for task_data in records:
+            page.append(task_data)
+            if len(page) == page_size:
+                yield from Task.from_data(client, page)
+                page = []
+        if page:
+            yield from Task.from_data(client, page)
+
+    @staticmethod
+    def from_data(client, tasks_data):
+        """ Return tasks for raw tasks data with messages fetched """
+        Task.fetch_messages(client, tasks_data)
         final_task_list = []
         for task in tasks_data:
-            # Read only partial data to messages. For now only create date, description
-            task['partial_messages'] = client.read('mail.message', task['message_ids'], ['date', 'description'])
             real_task = Task()
-            real_task.setup(task)
+            real_task.setup(task, score=False)
             final_task_list.append(real_task)
-        return final_task_list
-    
+        return score_tasks(final_task_list)
+
     @staticmethod
-    def search(client, name):
-        filters = []
-        filters.append(('name', 'ilike', name))
-        return Task.fetch_tasks(client, filters)
+    def sync_tasks(client, filters, cache):
+        """
+        Return raw tasks matching filters. Tasks missing from cache or
+        written after watermark of these filters are read from server and
+        saved to cache. Each set of filters has its own watermark, so
+        changes seen first by other filters are not skipped. Offline
+        cached tasks are filtered locally. Syncs sharing a cache run one
+        at a time so their watermarks, writes and prunes do not interleave.
+        """
+        with cache.lock:
+            return Task._sync_tasks(client, filters, cache)
 
+    @staticmethod
+    def _sync_tasks(client, filters, cache):
+        if client.offline:
+            return [task for task in cache.all('project.task').values() if match_domain(task, filters)]
+        # Newest write_date read with these filters
+        key = f'project.task {json.dumps(filters)}'
+        watermark = cache.watermark(key)
+        if not watermark:
+            fresh = client.search_read('project.task', filters, fields_for('project.task'))
+            task_ids = [task['id'] for task in fresh]
+            cached = {}
+        else:
+            task_ids = client.search('project.task', filters)
+            cached = cache.get('project.task', task_ids)
+            missing = [i for i in task_ids if i not in cached]
+            # Changed and never cached tasks in one round trip
+            fresh = client.search_read(
+                'project.task',
+                list(filters) + ['|', ('write_date', '>=', watermark), ('id', 'in', missing)],
+                fields_for('project.task'))
+            # Records written during the watermark second are cached already
+            fresh = [
+                task for task in fresh
+                if task['id'] not in cached
+                or task['write_date'] != cached[task['id']].get('write_date')
+            ]
+        if fresh:
+            Task.fetch_messages(client, fresh)
+            for task in fresh:
+                # Only newest message date is needed from messages
+                task['partial_messages'] = sorted(
+                    task['partial_messages'], key=lambda m: m['date'])[-1:]
+                cached[task['id']] = task
+            cache.put('project.task', fresh)
+            newest = max((task['write_date'] for task in fresh if task.get('write_date')), default=None)
+            if newest and newest > (watermark or ''):
+                cache.set_watermark(key, newest)
+        if cache.needs_prune('project.task'):
+            cache.prune('project.task', client)
+        return [cached[i] for i in task_ids if i in cached]
+
+    @staticmethod
+    def sync_messages(client, cache):
+        """
+        Update newest message of cached tasks from messages posted since
+        last call. Posting a message does not change task write_date.
+        Returns amount of updated tasks.
+        """
+        # Cached tasks were read with messages older than task watermark
+        watermark = cache.watermark('mail.message') or cache.watermark('project.task')
+        if not watermark:
+            return 0
+        messages = client.search_read(
+            'mail.message', [('model', '=', 'project.task'), ('date', '>=', watermark)], ['res_id', 'date'])
+        if not messages:
+            return 0
+        cached = cache.get('project.task', {message['res_id'] for message in messages})
+        changed = {}
+        for message in messages:
+            task = cached.get(message['res_id'])
+            newest = max((m['date'] for m in task['partial_messages']), default='') if task else None
+            if task and message['date'] > newest:
+                task['partial_messages'] = [{'id': message['id'], 'date': message['date']}]
+                changed[task['id']] = task
+        if changed:
+            cache.put('project.task', list(changed.values()))
+        cache.set_watermark('mail.message', max(message['date'] for message in messages))
+        return len(changed)
+
+    @staticmethod
+    def sync_index(client, cache, messages=False):
+        """
+        Update local search index of all tasks. Only tasks written since
+        last update or missing from index are read, with descriptions
+        and with message bodies if messages is set. Read tasks are
+        also saved to record cache.
+        """
+        task_ids = client.search('project.task', [])
+        indexed = cache.indexed()
+        removed = set(indexed) - set(task_ids)
+        if removed:
+            cache.unindex_tasks(removed)
+        watermark = cache.watermark(INDEX_MODEL)
+        missing = [i for i in task_ids if i not in indexed]
+        if not watermark:
+            filters = []
+        elif missing:
+            filters = ['|', ('write_date', '>=', watermark), ('id', 'in', missing)]
+        else:
+            filters = [('write_date', '>=', watermark)]
+        fresh = list(client.iter_search_read(
+            'project.task', filters, fields_for('project.task') + ['description']))
+        # Tasks written during the watermark second may be indexed already
+        fresh = [task for task in fresh if indexed.get(task['id']) != task['write_date']]
+        if not fresh:
+            return 0
+        Task.fetch_messages(client, fresh, ['date', 'body'] if messages else None)
+        rows = []
+        for task in fresh:
+            rows.append((
+                task['id'],
+                task['name'],
+                html_text(task.pop('description')),
+                ' '.join(html_text(m.get('body')) for m in task['partial_messages']),
+                task['write_date'],
+            ))
+            # Record cache keeps only newest message date like sync_tasks
+            task['partial_messages'] = [
+                {'id': m['id'], 'date': m['date']}
+                for m in sorted(task['partial_messages'], key=lambda m: m['date'])[-1:]
+            ]
+        cache.index_tasks(rows)
+        cache.put('project.task', fresh)
+        cache.set_watermark(INDEX_MODEL, max(task['write_date'] for task in fresh))
+        return len(fresh)
+
+    @staticmethod
+    def search(client, name, cache=None, messages=False):
+        """
+        Return tasks matching name. With cache the local search index is
+        updated and queried and results are ranked, best first.
+        """
+        if cache is None or not cache.fts:
+            filters = []
+            filters.append(('name', 'ilike', name))
+            return Task.fetch_tasks(client, filters, cache)
+        if client is not None and not client.offline:
+            Task.sync_index(client, cache, messages)
+        return Task.search_local(name, cache)
+
+    @staticmethod
+    def search_local(query, cache, limit=50):
+        """ Return ranked tasks from local index without server calls """
+        ids = cache.search_index(query, limit)
+        records = cache.get('project.task', ids)
+        tasks = []
+        for task_id in ids:
+            if task_id in records:
+                task = Task()
+                task.setup(records[task_id], score=False)
+                tasks.append(task)
+        return score_tasks(tasks)
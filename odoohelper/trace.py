@@ -0,0 +1,120 @@
+"""
+RPC tracing. Client records every call to the active tracer.
+Started by the global --trace and --trace-file options.
+"""
+import json
+import sys
+import threading
+import time
+from collections import namedtuple
+
+Record = namedtuple('Record', [
+    'model',
+    'method',
+    'records',
+    'request_bytes',
+    'response_bytes',
+    'seconds',
+    'error',
+])
+
+# Tracer used by Client or None when tracing is off
+_active = None
+
+
+def active():
+    return _active
+
+
+def start(path=None):
+    """ Start tracing. With path each call is appended as JSON line. """
+    global _active
+    _active = Tracer(path)
+    return _active
+
+
+def stop():
+    """ Stop tracing and return tracer """
+    global _active
+    tracer, _active = _active, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def payload_size(value):
+    """ Approximate JSON size of RPC arguments or result """
+    return len(json.dumps(value, default=str))
+
+
+def record_count(args, result):
+    """ Records returned, or records written for write like calls """
+    if isinstance(result, list):
+        return len(result)
+    if args and isinstance(args[0], list):
+        return len(args[0])
+    return 1
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+class Tracer():
+    """
+    Collects RPC records. Safe to use from Client.submit worker threads.
+    """
+
+    def __init__(self, path=None):
+        self.records = []
+        self.lock = threading.Lock()
+        self.file = open(path, 'a') if path else None
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def record(self, model, method, args, kwargs, result, seconds, error=None):
+        record = Record(
+            model=model,
+            method=method,
+            records=0 if error else record_count(args, result),
+            request_bytes=payload_size([args, kwargs]),
+            response_bytes=0 if error else payload_size(result),
+            seconds=seconds,
+            error=error,
+        )
+        with self.lock:
+            self.records.append(record)
+            if self.file is not None:
+                line = dict(record._asdict(), time=time.time())
+                self.file.write(json.dumps(line) + '\n')
+                self.file.flush()
+        return record
+
+    def summary(self):
+        """ Return per model and method summary table as text """
+        groups = {}
+        for record in self.records:
+            groups.setdefault((record.model, record.method), []).append(record)
+        lines = [f'{"model":20}{"method":20}{"calls":>6}{"records":>9}{"sent KB":>9}'
+                 f'{"recv KB":>9}{"total ms":>10}{"p50 ms":>9}{"max ms":>9}']
+        rows = sorted(groups.items(), key=lambda item: -sum(r.seconds for r in item[1]))
+        for (model, method), records in rows + [(('total', ''), self.records)]:
+            if not records:
+                continue
+            times = [record.seconds * 1000 for record in records]
+            lines.append(
+                f'{model:20}{method:20}{len(records):6}{sum(r.records for r in records):9}'
+                f'{sum(r.request_bytes for r in records) / 1024:9.1f}'
+                f'{sum(r.response_bytes for r in records) / 1024:9.1f}'
+                f'{sum(times):10.1f}{percentile(times, 50):9.1f}{max(times):9.1f}')
+        errors = sum(1 for record in self.records if record.error)
+        if errors:
+            lines.append(f'{errors} calls failed')
+        return '\n'.join(lines)
+
+    def print_summary(self, file=None):
+        print(self.summary(), file=file or sys.stderr)
@@ -3,8 +3,8 @@ All utils functions.
 """
 import os
 import datetime
+import functools
 import click
-import keyring
 
 from odoohelper.settings import Settings
 
@@ -18,10 +18,13 @@ def validate_odoo_date(ctx, param, value):
     except ValueError:
         raise click.BadParameter(f'date needs to be in format YYYY-MM-DD')
 
+@functools.lru_cache(maxsize=None)
 def get_pass():
     """
-    Get password from external source or return None for user prompt
+    Get password from external source or return None for user prompt.
+    Keyring is asked only once per process.
     """
+    import keyring
     pass_key = os.environ.get('ODOO_KEYRING_NAME', 'Odoo helper password')
     password = keyring.get_password("odoo-helper", pass_key)
     return password
@@ -30,8 +33,22 @@ def set_pass(password):
     """
     set password 
     """
+    import keyring
     pass_key = os.environ.get('ODOO_KEYRING_NAME', 'Odoo helper password')
     keyring.set_password("odoo-helper", pass_key, password)
+    get_pass.cache_clear()
+
+def resolve_password(ctx, param, value):
+    """
+    Password option callback. Keyring is only read when command runs
+    and user is prompted if there is no stored password.
+    """
+    if value:
+        return value
+    password = get_pass()
+    if password is None:
+        password = click.prompt('Password', hide_input=True)
+    return password
 
 def check_config():
     """
@@ -16,7 +16,7 @@ setup(
     author_email='ville.valtokari@ecxol.net',
     url='https://github.com/denvil/odoohelper',
     license=license,
-    packages=find_packages(exclude=('tests', 'docs')),
+    packages=find_packages(exclude=('tests', 'docs', 'benchmarks', 'benchmarks.*')),
     install_requires=[
         'Click',
         'openerp_proxy',
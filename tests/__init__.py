@@ -0,0 +1,22 @@
+def task_data(task_id, write_date='2018-10-20 00:00:00', **values):
+    """ Raw project.task record as read from server. Values override fields. """
+    data = {
+        'id': task_id,
+        'name': f'task {task_id}',
+        'description': '',
+        'stage_id': [1, 'stage'],
+        'user_id': [1, 'user'],
+        'project_id': [1, 'project'],
+        'full_project_name': 'project',
+        'date_deadline': False,
+        'create_date': '2018-10-20 00:00:00',
+        'date_start': False,
+        'date_end': False,
+        'message_ids': [task_id * 10],
+        'kanban_state': 'normal',
+        'planned_hours': 0,
+        'priority': '0',
+        'write_date': write_date,
+    }
+    data.update(values)
+    return data
@@ -0,0 +1,71 @@
+from datetime import date, datetime
+import unittest
+
+from odoohelper.attendance import compute_balance
+
+
+def attendance(check_in, hours, check_out=True):
+    return {
+        'check_in': check_in,
+        'check_out': check_out and check_in,
+        'worked_hours': hours,
+    }
+
+
+class AttendanceBalanceTestSuite(unittest.TestCase):
+    """Attendance balance engine tests"""
+    def balance(self, attendances, leaves=(), holidays=None):
+        return compute_balance(
+            attendances,
+            list(leaves),
+            start=datetime(2018, 10, 1),
+            end=datetime(2018, 10, 31, 23, 59, 59),
+            now=datetime(2018, 10, 10, 12, 0, 0),
+            utcnow=datetime(2018, 10, 10, 9, 0, 0),
+            local_holidays=holidays or {},
+        )
+
+    def test_days_are_summed(self):
+        """Attendances on same day are summed against allocated hours"""
+        balance = self.balance([
+            attendance('2018-10-01 08:00:00', 4),
+            attendance('2018-10-01 13:00:00', 4.5),
+            attendance('2018-10-02 08:00:00', 7),
+        ])
+        self.assertEqual([d.date for d in balance.days], [date(2018, 10, 1), date(2018, 10, 2)])
+        self.assertEqual(balance.days[0].worked_hours, 8.5)
+        self.assertEqual(balance.total_hours, 15.5)
+        self.assertEqual(balance.total_diff, 0.5)
+
+    def test_weekend_and_holiday(self):
+        """Weekends and holidays have no allocated hours"""
+        balance = self.balance([
+            attendance('2018-10-06 08:00:00', 2),
+            attendance('2018-10-08 08:00:00', 2),
+        ], holidays={date(2018, 10, 8): 'Test day'})
+        self.assertEqual(balance.days[0].notes, 'Weekend')
+        self.assertEqual(balance.days[1].notes, 'Test day')
+        self.assertEqual(balance.total_diff, 4)
+
+    def test_sick_leave_not_counted(self):
+        """Sick leave days are listed but not counted"""
+        balance = self.balance([
+            attendance('2018-10-02 08:00:00', 2),
+        ], leaves=[{
+            'name': 'flu',
+            'date_from': '2018-10-02 06:00:00',
+            'date_to': '2018-10-02 16:00:00',
+            'holiday_status_id': [2, 'Sick'],
+        }])
+        self.assertTrue(balance.days[0].sick_leave)
+        self.assertEqual(balance.total_hours, 0)
+        self.assertEqual(balance.total_diff, 0)
+
+    def test_open_attendance_is_today(self):
+        """Attendance without checkout is summed up to now"""
+        balance = self.balance([
+            attendance('2018-10-10 06:00:00', 0, check_out=False),
+        ])
+        self.assertEqual(balance.hours_today, 3)
+        self.assertEqual(balance.day_diff, 3 - 7.5)
+        self.assertEqual(balance.total_diff, 0)
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+from odoohelper.cache import Cache
+from odoohelper.tasks import Task
+from odoohelper.tasks.priority import score_tasks
+from tests import task_data
+
+
+class CacheTestSuite(unittest.TestCase):
+    """Task cache sync tests"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = Cache(os.path.join(self.tmp.name, 'cache.sqlite'))
+        self.cache.open()
+        self.server = {
+            1: task_data(1, '2018-10-20 00:00:00'),
+            2: task_data(2, '2018-10-21 00:00:00'),
+        }
+        self.messages = []
+        self.client = Mock(offline=False)
+        self.client.search = Mock(side_effect=self.search)
+        self.client.read = Mock(side_effect=self.read)
+        self.client.search_read = Mock(side_effect=self.search_read)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def matches(self, task, term):
+        if term[0] == 'write_date':
+            return task['write_date'] >= term[2]
+        if term[0] == 'id':
+            return task['id'] in term[2]
+        if term[0] == 'user_id':
+            return task['user_id'][0] == term[2]
+        return True
+
+    def search(self, model, filters):
+        ids = sorted(self.server)
+        filters = list(filters)
+        while filters:
+            term = filters.pop(0)
+            if term == '|':
+                first, second = filters.pop(0), filters.pop(0)
+                ids = [i for i in ids
+                       if self.matches(self.server[i], first) or self.matches(self.server[i], second)]
+            else:
+                ids = [i for i in ids if self.matches(self.server[i], term)]
+        return ids
+
+    def search_read(self, model, filters, fields=None, **kwargs):
+        if model == 'mail.message':
+            return [dict(m) for m in self.messages if m['date'] >= filters[1][2]]
+        return [dict(self.server[i]) for i in self.search(model, filters)]
+
+    def read(self, model, ids, fields=None):
+        if model == 'mail.message':
+            return [{'id': i, 'date': '2018-10-21 12:00:00'} for i in ids]
+        return [dict(self.server[i]) for i in ids]
+
+    def task_reads(self):
+        return [c for c in self.client.search_read.call_args_list if c[0][0] == 'project.task']
+
+    def test_second_fetch_uses_cache(self):
+        """Unchanged tasks should not be read again"""
+        Task.fetch_tasks(self.client, [], self.cache)
+        self.assertEqual(self.client.read.call_count, 1)
+        tasks = Task.fetch_tasks(self.client, [], self.cache)
+        # Task at watermark is returned by server but is not read again
+        self.assertEqual(len(self.task_reads()), 2)
+        self.assertEqual(self.client.read.call_count, 1)
+        self.assertEqual([t.id for t in tasks], [1, 2])
+
+    def test_changed_task_is_read(self):
+        """Only tasks written after watermark are read"""
+        Task.fetch_tasks(self.client, [], self.cache)
+        self.server[1] = task_data(1, '2018-10-22 00:00:00')
+        self.server[1]['name'] = 'changed'
+        tasks = Task.fetch_tasks(self.client, [], self.cache)
+        self.assertEqual(self.cache.get('project.task', [1])[1]['name'], 'changed')
+        self.assertEqual(tasks[0].name, 'changed')
+
+    def test_change_outside_filter_is_read(self):
+        """Sync with filters should not skip changes of other cached tasks"""
+        Task.fetch_tasks(self.client, [], self.cache)
+        self.server[2] = task_data(2, '2018-10-22 00:00:00', name='changed', user_id=[2, 'other'])
+        self.server[1] = task_data(1, '2018-10-23 00:00:00')
+        Task.fetch_tasks(self.client, [('user_id', '=', 1)], self.cache)
+        tasks = Task.fetch_tasks(self.client, [], self.cache)
+        self.assertEqual({task.id: task.name for task in tasks}[2], 'changed')
+
+    def test_filtered_sync_reads_only_matching_tasks(self):
+        """Sync with filters should not read changes of other tasks"""
+        Task.fetch_tasks(self.client, [('user_id', '=', 1)], self.cache)
+        self.server[3] = task_data(3, '2018-10-22 00:00:00', user_id=[2, 'other'])
+        self.server[1] = task_data(1, '2018-10-22 00:00:00', name='changed')
+        tasks = Task.fetch_tasks(self.client, [('user_id', '=', 1)], self.cache)
+        self.assertEqual({task.id: task.name for task in tasks}[1], 'changed')
+        self.assertEqual(self.cache.get('project.task', [3]), {})
+        self.assertIn(('user_id', '=', 1), self.task_reads()[-1][0][1])
+
+    def test_new_message_is_read(self):
+        """Messages posted after sync should update cached blocked tasks"""
+        self.server[1]['kanban_state'] = 'blocked'
+        blocked = Task.fetch_tasks(self.client, [], self.cache)
+        self.messages.append({'id': 99, 'res_id': 1, 'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+        tasks = Task.fetch_tasks(self.client, [], self.cache)
+        self.assertEqual(self.cache.get('project.task', [1])[1]['partial_messages'][-1]['id'], 99)
+        priorities = {task.id: task.priority for task in tasks}
+        self.assertLess(priorities[1], {task.id: task.priority for task in blocked}[1])
+        self.assertEqual(priorities[1], priorities[2])
+
+    def test_deleted_task_is_pruned(self):
+        """Deleted tasks should be removed from cache"""
+        Task.fetch_tasks(self.client, [], self.cache)
+        del self.server[2]
+        self.cache.prune('project.task', self.client)
+        self.assertEqual(self.cache.ids('project.task'), {1})
+
+    def test_priorities_are_cached(self):
+        """With limit priorities are scored again only for changed tasks"""
+        with patch('odoohelper.tasks.tasks.score_tasks', side_effect=score_tasks) as score:
+            first = Task.fetch_tasks(self.client, [], self.cache, limit=2)
+            self.assertEqual(len(score.call_args[0][0]), 2)
+            second = Task.fetch_tasks(self.client, [], self.cache, limit=2)
+            self.assertEqual(score.call_count, 1)
+            # Full listing scores all tasks
+            self.assertEqual([t.id for t in Task.fetch_tasks(self.client, [], self.cache)], [t.id for t in first])
+            self.assertEqual(score.call_count, 2)
+            self.assertEqual([(t.id, t.priority) for t in first], [(t.id, t.priority) for t in second])
+            self.server[2] = task_data(2, '2018-10-22 00:00:00', priority='1')
+            tasks = Task.fetch_tasks(self.client, [], self.cache, limit=1)
+        self.assertEqual(score.call_count, 3)
+        self.assertEqual([task.id for task in score.call_args[0][0]], [2])
+        self.assertEqual([(task.id, task.priority) for task in tasks], [(2, first[0].priority + 40)])
+        # Other rules make cached priorities invalid
+        self.assertEqual(self.cache.priorities([1, 2], 'other rules', 0), {})
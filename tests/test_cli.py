@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from odoohelper.odoohelper import cli
+
+
+class CliStartupTestSuite(unittest.TestCase):
+    """CLI startup should not touch keyring"""
+    def test_help_does_not_read_keyring(self):
+        with patch('odoohelper.utils.get_pass') as get_pass:
+            runner = CliRunner()
+            result = runner.invoke(cli, ['--help'])
+            self.assertEqual(result.exit_code, 0)
+            self.assertIn('tasks', result.output)
+            result = runner.invoke(cli, ['tasks', '--help'])
+            self.assertEqual(result.exit_code, 0)
+            get_pass.assert_not_called()
+
+    def test_main_without_daemon_skips_daemon_module(self):
+        script = (
+            'import sys; from odoohelper.odoohelper import main; sys.argv = ["odoohelper", "--help"]\n'
+            'try:\n    main()\nexcept SystemExit:\n    pass\n'
+            'print("odoohelper.daemon" in sys.modules)')
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, ODOO_SOCKET=os.path.join(directory, 'daemon.sock'))
+            result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True)
+        self.assertEqual(result.stdout.splitlines()[-1], 'False')
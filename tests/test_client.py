@@ -0,0 +1,124 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+from openerp_proxy.exceptions import ConnectorError
+
+from odoohelper.client import Client
+
+
+class ClientSessionTestSuite(unittest.TestCase):
+    """Session persistence tests"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {'ODOO_SESSION': os.path.join(self.tmp.name, 'session.json')})
+        self.env.start()
+        self.erp = patch('openerp_proxy.Client').start()
+        self.logins = 0
+
+        def new_client(**kwargs):
+            erp = MagicMock()
+            erp._uid = None
+
+            def uid():
+                self.logins += 1
+                return 7
+            type(erp).uid = property(lambda s: uid())
+            return erp
+        self.erp.side_effect = new_client
+
+    def tearDown(self):
+        patch.stopall()
+        self.tmp.cleanup()
+
+    def new_client(self):
+        client = Client(username='user', password='pass', database='db', host='host')
+        client.connect()
+        return client
+
+    def test_session_reused(self):
+        """Second connect should not authenticate again"""
+        first = self.new_client()
+        self.assertFalse(first.session_reused)
+        second = self.new_client()
+        self.assertTrue(second.session_reused)
+        self.assertEqual(second.user.id, 7)
+        self.assertEqual(self.logins, 1)
+
+    def test_rejected_session_logs_in(self):
+        """Rejected session should login again and retry call"""
+        self.new_client()
+        client = self.new_client()
+        error = ConnectorError('Access Denied')
+        client.client['project.task'].search.side_effect = [error, [1, 2]]
+        self.assertEqual(client.search('project.task', []), [1, 2])
+        self.assertEqual(self.logins, 2)
+        self.assertFalse(client.session_reused)
+
+
+    def test_concurrent_rejected_calls_login_once(self):
+        """Calls rejected with same session should share one login"""
+        self.new_client()
+        client = self.new_client()
+        barrier = threading.Barrier(2)
+        session = {'uid': None}
+
+        def search(filters):
+            if session['uid'] is None:
+                barrier.wait(timeout=5)
+                session['uid'] = 'rejected'
+                raise ConnectorError('Access Denied')
+            return [1]
+        client.client['project.task'].search.side_effect = search
+        client.login = Mock(side_effect=lambda: setattr(client, 'logins', client.logins + 1) or session.update(uid=7))
+        threads = [threading.Thread(target=client.search, args=('project.task', [])) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.login.assert_called_once()
+
+    def test_unanswered_create_is_not_queued(self):
+        """Server may have created record when answer is lost, writes are queued"""
+        client = self.new_client()
+        client.operation_log = MagicMock()
+        timeout = ConnectorError('Cannot connect to url http://host/jsonrpc\nException Read timed out. raised!')
+        client.client.execute.side_effect = timeout
+        with self.assertRaises(ConnectorError):
+            client.create('project.task', {'name': 'Task'})
+        self.assertTrue(client.write('project.task', [1], {'name': 'Task'}))
+        client.operation_log().append.assert_called_once()
+        self.assertTrue(client.offline)
+
+
+class ClientSubmitTestSuite(unittest.TestCase):
+    """Concurrent request tests"""
+    def test_submitted_calls_run_concurrently(self):
+        """Independent calls should be in flight at the same time"""
+        import threading
+        barrier = threading.Barrier(2, timeout=5)
+
+        def call(value):
+            barrier.wait()
+            return value
+
+        client = Client(username='user')
+        self.assertEqual(client.gather(client.submit(call, 1), client.submit(call, 2)), [1, 2])
+        client.close()
+
+
+class ClientPagingTestSuite(unittest.TestCase):
+    """Paginated search_read tests"""
+    def test_iter_search_read_pages(self):
+        """Records should be fetched with fixed size pages"""
+        records = [{'id': i} for i in range(5)]
+        client = Client(username='user')
+        client.client = MagicMock()
+        client.client.execute.side_effect = \
+            lambda model, method, fields=None, domain=None, order=None, limit=None, offset=0: \
+            records[offset:offset + limit]
+        result = list(client.iter_search_read('project.task', [], page_size=2))
+        self.assertEqual(result, records)
+        self.assertEqual(client.client.execute.call_count, 3)
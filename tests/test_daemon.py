@@ -0,0 +1,103 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from benchmarks.e2e import configure
+from benchmarks.mock_server import PASSWORD, MockOdoo, generate
+from odoohelper import settings
+from odoohelper.cache import Cache
+from odoohelper.client import Client
+from odoohelper.daemon import Daemon, forward, served
+from odoohelper.settings import get_config
+
+
+class DaemonTestSuite(unittest.TestCase):
+    """Commands forwarded to daemon are answered from its cache"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mock = MockOdoo(generate(users=2, projects=2, tasks=50, days=10))
+        self.mock.start()
+        env = configure(self.tmp.name, self.mock.port)
+        env['ODOO_SOCKET'] = os.path.join(self.tmp.name, 'daemon.sock')
+        self.env = patch.dict(os.environ, env)
+        self.env.start()
+        self.client = Client.from_config(get_config(), PASSWORD)
+        self.client.connect()
+        self.daemon = Daemon(self.client, interval=3600)
+        self.thread = threading.Thread(target=self.daemon.serve)
+        self.thread.start()
+        for _ in range(100):
+            if self.daemon.polled:
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        self.client.close()
+        self.env.stop()
+        self.mock.stop()
+        self.tmp.cleanup()
+
+    def forward(self, args):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            exit_code = forward(args)
+        return exit_code, output.getvalue()
+
+    def test_served(self):
+        self.assertTrue(served(['tasks', '-n', '5']))
+        self.assertTrue(served(['search', 'Task']))
+        self.assertFalse(served(['search']))
+        self.assertFalse(served(['tasks', '-i']))
+        self.assertFalse(served(['create']))
+        self.assertFalse(served(['--trace', 'tasks']))
+
+    def test_tasks_from_cache(self):
+        self.assertIsNotNone(self.daemon.polled)
+        self.mock.reset()
+        exit_code, output = self.forward(['tasks'])
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(self.mock.reset(), [])
+        mine = [t for t in self.mock.data['project.task'].values()
+                if t['user_id'][0] == 1 and t['stage_id'][0] != 8]
+        self.assertEqual(len(output.splitlines()), len(mine) + 1)
+
+    def test_attendance_from_cache(self):
+        self.mock.reset()
+        exit_code, output = self.forward(['attendance'])
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(self.mock.reset(), [])
+        self.assertIn('Balance now', output)
+
+    def test_new_message_is_polled(self):
+        task = next(t for t in self.mock.data['project.task'].values() if t['user_id'][0] == 1)
+        self.mock.data['mail.message'][10 ** 6] = {
+            'id': 10 ** 6, 'date': '2099-01-01 00:00:00', 'model': 'project.task',
+            'res_id': task['id'], 'body': ''}
+        self.assertTrue(self.daemon.poll())
+        with Cache() as cache:
+            cached = cache.get('project.task', [task['id']])[task['id']]
+        self.assertEqual(cached['partial_messages'][-1]['date'], '2099-01-01 00:00:00')
+
+    def test_poll_with_stage_names(self):
+        with open(os.environ['ODOO_CONFIG']) as f:
+            config = json.load(f)
+        config['stages'] = {'done': ['Tehty']}
+        with open(os.environ['ODOO_CONFIG'], 'w') as f:
+            json.dump(config, f)
+        settings._configs.clear()
+        try:
+            self.assertTrue(self.daemon.poll())
+        finally:
+            settings._configs.clear()
+
+    def test_no_daemon(self):
+        with patch.dict(os.environ, {'ODOO_SOCKET': os.path.join(self.tmp.name, 'missing.sock')}):
+            self.assertIsNone(forward(['tasks']))
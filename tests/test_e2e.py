@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from benchmarks.e2e import SCENARIOS, configure, run
+from benchmarks.mock_server import MockOdoo, generate
+
+
+class EndToEndTestSuite(unittest.TestCase):
+    """Commands against mock Odoo server stay within RPC budgets"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mock = MockOdoo(generate(users=4, projects=5, tasks=200, days=10))
+        self.mock.start()
+        self.env = patch.dict(os.environ, configure(self.tmp.name, self.mock.port))
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.mock.stop()
+        self.tmp.cleanup()
+
+    def test_scenarios_within_budget(self):
+        for name, command, budget in SCENARIOS:
+            with self.subTest(name):
+                for _ in range(2):
+                    result, calls, _ = run(self.mock, command)
+                    self.assertEqual(result.exit_code, 0, result.output)
+                # Budget is for warm caches
+                self.assertLessEqual(len(calls), budget)
+
+    def test_tasks_listed(self):
+        result, _, _ = run(self.mock, ['tasks'])
+        mine = [t for t in self.mock.data['project.task'].values()
+                if t['user_id'][0] == 1 and t['stage_id'][0] != 8]
+        # Header and one line per task
+        self.assertEqual(len(result.stdout.splitlines()), len(mine) + 1)
+
+    def test_team_row_without_attendances(self):
+        attendances = self.mock.data['hr.attendance']
+        for attendance_id in [i for i, a in attendances.items() if a['employee_id'][0] == 3]:
+            del attendances[attendance_id]
+        result, _, _ = run(self.mock, ['attendance', '-d', 'Development', '--csv'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        rows = result.stdout.splitlines()[1:]
+        self.assertEqual([row.split(',')[0] for row in rows], ['User 1', 'User 3'])
+        self.assertTrue(rows[1].startswith('User 3,0.00,'))
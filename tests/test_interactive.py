@@ -0,0 +1,67 @@
+from concurrent.futures import Future
+import unittest
+from unittest.mock import Mock, patch
+
+from openerp_proxy.exceptions import ConnectorError
+
+from odoohelper.tasks import Task
+from odoohelper.tasks.interactive import TaskQueue
+from tests import task_data
+
+
+class TaskQueueTestSuite(unittest.TestCase):
+    """Interactive queue refresh tests"""
+    def setUp(self):
+        self.server = {i: task_data(i, message_ids=[], partial_messages=[]) for i in (1, 2, 3)}
+        self.client = Mock(offline=False)
+        self.client.search_read = Mock(side_effect=self.search_read)
+        self.client.read = Mock(return_value=[])
+        self.client.submit = Mock(side_effect=self.submit)
+        self.queue = TaskQueue(self.client, [Task(dict(self.server[i])) for i in (1, 2, 3)])
+
+    def search_read(self, model, filters, fields=None, **kwargs):
+        ids = filters[0][2]
+        return [dict({key: self.server[i][key] for key in fields if key in self.server[i]}, id=i) for i in ids]
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    def full_reads(self):
+        return [c for c in self.client.search_read.call_args_list if c[0][2] != ['write_date']]
+
+    def test_unchanged_tasks_not_reloaded(self):
+        """Moving between unchanged tasks only checks write_date"""
+        self.queue.current(0)
+        self.queue.current(1)
+        self.assertEqual(self.client.search_read.call_count, 2)
+        self.assertEqual(self.full_reads(), [])
+
+    def test_changed_neighbour_reloaded(self):
+        """Neighbour with new write_date is read again"""
+        self.server[2]['name'] = 'changed'
+        self.server[2]['write_date'] = '2018-10-21 00:00:00'
+        self.queue.current(0)
+        self.assertEqual(len(self.full_reads()), 1)
+        self.assertEqual(self.queue.tasks[1].name, 'changed')
+
+    def test_written_task_reloaded(self):
+        """Written task is read back without write_date check"""
+        task = self.queue.tasks[0]
+        self.server[1]['name'] = 'written'
+        self.queue.written(task)
+        self.assertEqual(self.client.search_read.call_count, 1)
+        self.assertEqual(task.name, 'written')
+
+    def test_failed_check_keeps_tasks(self):
+        """Network error in background check is reported once"""
+        self.client.search_read.side_effect = ConnectorError('Cannot connect to url')
+        with patch('odoohelper.tasks.interactive.click.echo') as echo:
+            self.queue.current(0)
+            self.assertEqual(self.queue.current(1).id, 2)
+            self.assertEqual(self.queue.current(2).id, 3)
+        self.assertEqual(echo.call_count, 1)
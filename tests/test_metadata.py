@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import Future
+from unittest.mock import Mock, patch
+
+from odoohelper import metadata, settings
+from odoohelper.cache import Cache
+from odoohelper.metadata import Metadata, fuzzy_score, stage_map
+
+
+class MetadataTestSuite(unittest.TestCase):
+    """Cached users, projects and stages"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config = os.path.join(self.tmp.name, 'config.json')
+        self.write_config({})
+        patch.dict(os.environ, {'ODOO_CONFIG': self.config}).start()
+        settings._configs.clear()
+        self.cache = Cache(os.path.join(self.tmp.name, 'cache.sqlite'))
+        self.cache.open()
+        self.server = {
+            'project.project': [
+                {'id': 1, 'name': 'Website redesign', 'display_name': 'Website redesign', 'write_date': '2018-10-20 00:00:00'},
+                {'id': 2, 'name': 'Intranet', 'display_name': 'Intranet', 'write_date': '2018-10-21 00:00:00'},
+            ],
+            'project.task.type': [
+                {'id': 8, 'name': 'Done', 'display_name': 'Done', 'write_date': '2018-10-20 00:00:00'},
+                {'id': 30, 'name': 'Archived', 'display_name': 'Archived', 'write_date': '2018-10-20 00:00:00'},
+            ],
+        }
+        self.client = Mock(offline=False)
+        self.client.search_read = Mock(side_effect=self.search_read)
+        self.client.search = Mock(side_effect=lambda model, filters: [r['id'] for r in self.server[model]])
+        self.client.submit = Mock(side_effect=self.submit)
+
+    def tearDown(self):
+        patch.stopall()
+        settings._configs.clear()
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def write_config(self, config):
+        with open(self.config, 'w') as f:
+            json.dump(config, f)
+        settings._configs.clear()
+
+    def search_read(self, model, filters, fields=None):
+        since = [term[2] for term in filters if term[0] == 'write_date']
+        return [dict(r) for r in self.server[model] if not since or r['write_date'] >= since[0]]
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def test_fuzzy_score(self):
+        """Substring beats word prefix beats misspelling"""
+        self.assertGreater(fuzzy_score('web', 'Website redesign'), fuzzy_score('web re', 'Website redesign'))
+        self.assertEqual(fuzzy_score('web re', 'Website redesign'), 2)
+        self.assertGreater(fuzzy_score('intarnet', 'Intranet'), 0)
+        self.assertEqual(fuzzy_score('xyz', 'Intranet'), 0)
+
+    def test_match_is_local_after_first_load(self):
+        """Prompts should match cached names without server calls"""
+        with Metadata(self.client, self.cache) as meta:
+            self.assertEqual([r['id'] for r in meta.match('project.project', 'web')], [1])
+            self.assertEqual([r['id'] for r in meta.match('project.project', 'intarnet')], [2])
+        self.assertEqual(self.client.search_read.call_count, 1)
+
+    def test_refresh_after_ttl(self):
+        """Stale cache should be served and refreshed with write_date check"""
+        with Metadata(self.client, self.cache) as meta:
+            meta.records('project.project')
+        self.server['project.project'].append(
+            {'id': 3, 'name': 'Webshop', 'display_name': 'Webshop', 'write_date': '2018-10-22 00:00:00'})
+        with patch.object(metadata.time, 'time', return_value=time.time() + metadata.METADATA_TTL + 1):
+            with Metadata(self.client, self.cache) as meta:
+                meta.records('project.project')
+        self.assertEqual(self.client.search_read.call_args[0][1][-1], ('write_date', '>=', '2018-10-21 00:00:00'))
+        self.assertEqual(sorted(self.cache.all('project.project')), [1, 2, 3])
+
+    def test_stage_map(self):
+        """Stages come from config as ids or names"""
+        self.assertEqual(stage_map()['done'], [8])
+        self.write_config({'stages': {'done': ['Done', 'archived'], 'inbox': 15}})
+        with patch.dict(os.environ, {'ODOO_CACHE': self.cache.path}):
+            # Names are not cached yet
+            with self.assertRaises(ValueError):
+                stage_map()
+            with Metadata(self.client, self.cache) as meta:
+                stages = stage_map(meta)
+            self.assertEqual(sorted(stages['done']), [8, 30])
+            self.assertEqual(stages['inbox'], [15])
+            self.assertEqual(stages['active'], [7, 6])
+            # Without metadata names are resolved from cached stages
+            self.assertEqual(stage_map(), stages)
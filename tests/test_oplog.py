@@ -0,0 +1,178 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from openerp_proxy.exceptions import ConnectorError
+
+from benchmarks.e2e import configure, run
+from benchmarks.mock_server import MockOdoo, generate
+from odoohelper.cache import Cache, match_domain
+from odoohelper.oplog import OperationLog
+
+
+class OperationLogTestSuite(unittest.TestCase):
+    """Queued operations are replayed in batches with conflict checks"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = Cache(os.path.join(self.tmp.name, 'cache.sqlite'))
+        self.cache.open()
+        self.log = OperationLog(self.cache)
+        self.server = {1: '2018-11-01 10:00:00', 2: '2018-11-01 10:00:00', 3: '2018-11-02 10:00:00'}
+        self.client = Mock()
+        self.client.search_read = Mock(side_effect=lambda model, filters, fields: [
+            {'id': i, 'write_date': self.server[i]} for i in filters[0][2] if i in self.server])
+        self.client.send = Mock(return_value=100)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_writes_are_merged(self):
+        self.log.append('project.task', 'write', [[1, 2], {'stage_id': 8}], {1: self.server[1], 2: self.server[2]})
+        self.log.append('project.task', 'write', [[1], {'priority': '1'}], {1: self.server[1]})
+        self.log.append('project.task', 'write', [[2], {'priority': '1'}], {2: self.server[2]})
+        replayed = self.log.replay(self.client)
+        self.assertEqual(replayed.applied, 3)
+        self.assertEqual(self.client.search_read.call_count, 1)
+        self.client.send.assert_called_once_with('project.task', 'write', [1, 2], {'stage_id': 8, 'priority': '1'})
+        self.assertEqual(self.log.count(), 0)
+
+    def test_conflict_is_not_written(self):
+        self.log.append('project.task', 'write', [[3], {'stage_id': 8}], {3: '2018-11-01 10:00:00'})
+        self.log.append('project.task', 'write', [[1], {'stage_id': 8}], {1: self.server[1]})
+        replayed = self.log.replay(self.client)
+        self.assertEqual(len(replayed.conflicts), 1)
+        self.client.send.assert_called_once_with('project.task', 'write', [1], {'stage_id': 8})
+        conflict, = self.log.pending(conflicts=True)
+        self.assertIn('changed on server', conflict.conflict)
+        # Conflicts are sent only when forced
+        self.assertEqual(self.log.replay(self.client).applied, 0)
+        self.assertEqual(self.log.replay(self.client, force=True).applied, 1)
+        self.assertEqual(self.log.count(), 0)
+
+    def test_created_id_is_mapped(self):
+        created = self.log.append('project.task', 'create', [{'name': 'Offline'}])
+        self.log.append('project.task', 'start_tracking', [[-created]])
+        self.assertEqual(self.log.last_started(), [-created])
+        self.log.replay(self.client)
+        self.assertEqual(self.client.send.call_args_list[1][0], ('project.task', 'start_tracking', [100]))
+
+    def test_rejected_operation_is_failed(self):
+        def send(model, method, *args):
+            if model == 'missing.model':
+                raise ConnectorError("Object missing.model doesn't exist")
+            return 100
+        self.client.send = Mock(side_effect=send)
+        self.log.append('missing.model', 'create', [{'name': 'Offline'}])
+        self.log.append('project.task', 'write', [[1], {'stage_id': 8}], {1: self.server[1]})
+        replayed = self.log.replay(self.client)
+        self.assertEqual(replayed.applied, 1)
+        failed, = self.log.pending(conflicts=True)
+        self.assertEqual(failed.model, 'missing.model')
+        self.assertIn('failed', failed.conflict)
+
+    def test_unreachable_stops_replay(self):
+        self.client.send = Mock(side_effect=ConnectorError('Cannot connect to url'))
+        self.log.append('project.task', 'create', [{'name': 'Offline'}])
+        with self.assertRaises(ConnectorError):
+            self.log.replay(self.client)
+        queued, = self.log.pending()
+        self.assertIsNone(queued.conflict)
+
+    def test_unanswered_create_is_not_repeated(self):
+        self.client.send = Mock(side_effect=ConnectorError(
+            'Cannot connect to url http://host/jsonrpc\nException Read timed out. raised!'))
+        self.log.append('project.task', 'create', [{'name': 'Offline'}])
+        with self.assertRaises(ConnectorError):
+            self.log.replay(self.client)
+        self.assertEqual(self.log.pending(), [])
+        failed, = self.log.pending(conflicts=True)
+        self.assertIn('no answer', failed.conflict)
+
+    def test_match_domain(self):
+        record = {'user_id': [1, 'User 1'], 'stage_id': [8, 'Done'], 'name': 'Fix login', 'date_deadline': False}
+        self.assertTrue(match_domain(record, [('user_id', '=', 1), ('stage_id', 'in', [8])]))
+        self.assertTrue(match_domain(record, ['|', ('name', 'ilike', 'LOGIN'), ('user_id', '=', 2)]))
+        self.assertFalse(match_domain(record, [('date_deadline', '<=', '2018-11-01')]))
+        self.assertFalse(match_domain(record, ['!', ('stage_id', 'not in', [7])]))
+
+
+class OfflineCommandTestSuite(unittest.TestCase):
+    """Commands queue changes while offline and sync sends them"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mock = MockOdoo(generate(users=2, projects=2, tasks=20, days=10))
+        self.mock.start()
+        self.env = patch.dict(os.environ, configure(self.tmp.name, self.mock.port))
+        self.env.start()
+        # Store session and fill caches while online
+        result, _, _ = run(self.mock, ['tasks'])
+        self.assertEqual(result.exit_code, 0, result.output)
+
+    def tearDown(self):
+        self.env.stop()
+        self.mock.stop()
+        self.tmp.cleanup()
+
+    def test_instant_offline(self):
+        tasks = len(self.mock.data['project.task'])
+        for command in (['--offline', 'instant'], ['--offline', 'stop'], ['--offline', 'tasks']):
+            result, calls, _ = run(self.mock, command)
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertEqual(calls, [])
+        self.assertEqual(len(self.mock.data['project.task']), tasks)
+        result, _, _ = run(self.mock, ['sync'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('3 operations sent', result.output)
+        self.assertEqual(len(self.mock.data['project.task']), tasks + 1)
+        self.assertFalse(self.mock.data['hr.employee'][1]['current_task'])
+
+    def test_stop_offline_tracked_online(self):
+        result, _, _ = run(self.mock, ['instant'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertTrue(self.mock.data['hr.employee'][1]['current_task'])
+        result, calls, _ = run(self.mock, ['--offline', 'stop'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(calls, [])
+        result, _, _ = run(self.mock, ['sync'])
+        self.assertIn('1 operations sent', result.output)
+        self.assertFalse(self.mock.data['hr.employee'][1]['current_task'])
+        # Stopped task is not stopped again
+        result, _, _ = run(self.mock, ['--offline', 'stop'])
+        self.assertIn('Nothing to show', result.output)
+
+    def test_unreachable_login_goes_offline(self):
+        with open(os.environ['ODOO_SESSION']) as f:
+            sessions = json.load(f)
+        for session in sessions.values():
+            session['created'] = 0
+        with open(os.environ['ODOO_SESSION'], 'w') as f:
+            json.dump(sessions, f)
+        self.mock.stop()
+        result, _, _ = run(self.mock, ['tasks'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Task', result.output)
+
+    def test_offline_needs_server(self):
+        for command in (['--offline', 'project', '-p', '1'], ['--offline', 'attendance', '-u', 'User 2']):
+            result, calls, _ = run(self.mock, command)
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn('a server connection', result.output)
+            self.assertEqual(calls, [])
+
+    def test_rejected_operation_does_not_block(self):
+        with Cache() as cache:
+            OperationLog(cache).append('missing.model', 'write', [[1], {'name': 'x'}], {1: '2018-11-01 10:00:00'})
+        result, _, _ = run(self.mock, ['tasks'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        result, _, _ = run(self.mock, ['sync'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('missing.model write', result.output)
+        self.assertIn('failed', result.output)
+        result, _, _ = run(self.mock, ['sync', '--discard'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('1 operations discarded', result.output)
+        with Cache() as cache:
+            self.assertEqual(OperationLog(cache).count(), 0)
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+import unittest
+
+from odoohelper.tasks import Task
+from odoohelper.tasks.priority import (
+    DEFAULT_RULES, FOREVER, compile_rules, explain_task, now_microseconds, score_tasks, valid_until)
+from tests import task_data
+
+
+# Starred blocked inbox task with deadline
+BLOCKED = {
+    'stage_id': [14, 'Inbox'],
+    'project_id': [3, 'Project'],
+    'date_deadline': '2018-10-31',
+    'date_start': '2018-10-20 00:00:00',
+    'partial_messages': [{'date': '2018-10-21 12:00:00'}],
+    'kanban_state': 'blocked',
+    'priority': '1',
+}
+
+
+class PriorityRulesTestSuite(unittest.TestCase):
+    """Configurable priority rule tests"""
+    now = datetime(2018, 10, 25, 12, 0, 0)
+
+    def test_custom_weights(self):
+        """Rule weights should come from rules"""
+        scorer = compile_rules([
+            {'name': 'Star', 'type': 'star', 'weight': 7},
+            {'name': 'Plan', 'type': 'planned_hours', 'weight': 3},
+        ])
+        task = score_tasks([Task(task_data(1, **BLOCKED))], self.now, scorer)[0]
+        self.assertEqual(task.priority, 10)
+
+    def test_stage_and_project_rules(self):
+        """Extra rules match by id or name"""
+        scorer = compile_rules([
+            {'name': 'Inbox', 'type': 'stage', 'values': ['Inbox'], 'weight': 100},
+            {'name': 'Project', 'type': 'project', 'values': [3], 'weight': 10},
+            {'name': 'Other', 'type': 'project', 'values': [4], 'weight': 1},
+        ])
+        task = score_tasks([Task(task_data(1, **BLOCKED))], self.now, scorer)[0]
+        self.assertEqual(task.priority, 110)
+
+    def test_explain(self):
+        """Explain should list contribution of every rule"""
+        scorer = compile_rules(DEFAULT_RULES)
+        task = score_tasks([Task(task_data(1, **BLOCKED))], self.now, scorer)[0]
+        explained = explain_task(task, self.now, scorer)
+        self.assertEqual([name for name, _ in explained], [rule['name'] for rule in DEFAULT_RULES])
+        self.assertEqual(sum(weight for _, weight in explained), task.priority)
+        self.assertEqual(dict(explained)['Check for blocking'], 5 * 4)
+
+    def test_unknown_rule(self):
+        """Unknown rule type should fail when compiling"""
+        with self.assertRaises(ValueError):
+            compile_rules([{'name': 'x', 'type': 'nope', 'weight': 1}])
+        with self.assertRaises(ValueError):
+            compile_rules([{'name': 'x', 'type': 'star', 'weight': '1; import os'}])
+
+    def test_valid_until(self):
+        """Priority stays same until valid until time and changes after"""
+        scorer = compile_rules(DEFAULT_RULES)
+        tasks = [Task(task_data(index, **dict(BLOCKED, date_deadline=f'2018-10-{day}'))) for index, day in enumerate((26, 28, 31))]
+        tasks.append(Task(task_data(4, **dict(BLOCKED, date_deadline=False, kanban_state='normal'))))
+        for hour in range(0, 24 * 10, 5):
+            now = self.now + timedelta(hours=hour)
+            scores = [task.priority for task in score_tasks(tasks, now, scorer)]
+            for task, score, until in zip(tasks, scores, valid_until(tasks, now, scorer)):
+                if until == FOREVER:
+                    continue
+                self.assertGreater(until, now_microseconds(now))
+                last = now + timedelta(microseconds=until - now_microseconds(now) - 1)
+                self.assertEqual(score_tasks([task], last, scorer)[0].priority, score)
+                after = now + timedelta(microseconds=until - now_microseconds(now) + 1)
+                self.assertNotEqual(score_tasks([task], after, scorer)[0].priority, score)
+        self.assertEqual(valid_until(tasks[3:], self.now, scorer), [FOREVER])
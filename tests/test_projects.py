@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from click.testing import CliRunner
+
+from odoohelper.projects.commands import project, write_project_pages
+from odoohelper.tasks import Task
+from tests import task_data
+
+
+def task(task_id, project_id, stage_id):
+    return Task(task_data(
+        task_id, stage_id=[stage_id, 'stage'], project_id=[project_id, 'project'], partial_messages=[]))
+
+
+class ProjectCommandTestSuite(unittest.TestCase):
+    """Project command reads"""
+    def setUp(self):
+        self.client = MagicMock(offline=False)
+        client_class = patch('odoohelper.projects.commands.Client').start()
+        client_class.from_config.return_value = self.client
+        patch('odoohelper.projects.commands.check_config').start()
+        patch('odoohelper.projects.commands.Cache').start()
+        settings = patch('odoohelper.projects.commands.Settings').start()
+        settings.return_value.__enter__.return_value = {
+            'username': 'user', 'database': 'db', 'host': 'host'}
+        self.page = patch('odoohelper.projects.commands.print_project_page').start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_project_read_by_id(self):
+        """Project page should read only the requested project"""
+        self.client.search_read.return_value = [{'id': 5}]
+        result = CliRunner().invoke(project, ['-p', '5', '--password', 'x'])
+        self.assertEqual(result.exit_code, 0)
+        model, filters, fields = self.client.search_read.call_args[0]
+        self.assertEqual(filters, [('id', '=', 5)])
+        self.assertNotIn('tasks', fields)
+        self.page.assert_called_once()
+
+    def test_list_projects_light(self):
+        """Listing should page through ids and names only"""
+        self.client.iter_search_read.return_value = iter([{'id': 1, 'display_name': 'One'}])
+        result = CliRunner().invoke(project, ['-l', '--password', 'x'])
+        self.assertEqual(result.output, '1\tOne\n')
+        self.assertEqual(self.client.iter_search_read.call_args[0][2], ['id', 'display_name'])
+        self.client.search_read.assert_not_called()
+
+
+class ProjectPagesTestSuite(unittest.TestCase):
+    """Portfolio pages"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config = os.path.join(self.tmp.name, 'config.json')
+        with open(config, 'w') as f:
+            json.dump({'host': 'host'}, f)
+        patch.dict(os.environ, {'ODOO_CONFIG': config}).start()
+
+    def tearDown(self):
+        patch.stopall()
+        self.tmp.cleanup()
+
+    def test_pages_from_one_query(self):
+        """Tasks of all projects should be read once and grouped per project"""
+        projects = [
+            {'id': 1, 'display_name': 'One', 'description': '', 'task_count': 2},
+            {'id': 2, 'display_name': 'Two', 'description': '', 'task_count': 1},
+            {'id': 3, 'display_name': 'Three', 'description': '', 'task_count': 0},
+        ]
+        tasks = [task(10, 1, 7), task(11, 1, 14), task(20, 2, 6)]
+        output = os.path.join(self.tmp.name, 'out')
+        with patch.object(Task, 'fetch_tasks', return_value=tasks) as fetch:
+            paths = list(write_project_pages(MagicMock(), projects, output, jobs=2))
+        fetch.assert_called_once()
+        self.assertEqual([os.path.basename(p) for p in paths], ['project-1.md', 'project-2.md', 'project-3.md'])
+        with open(paths[0]) as f:
+            page = f.read()
+        self.assertIn('## One', page)
+        self.assertIn('[task 10] starts on', page)
+        self.assertIn('### Inbox tasks', page)
+        with open(paths[1]) as f:
+            self.assertNotIn('task 10', f.read())
+        with open(paths[2]) as f:
+            self.assertIn('No tasks...', f.read())
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from odoohelper.cache import Cache
+from odoohelper.tasks import Task
+from tests import task_data
+
+
+class SearchIndexTestSuite(unittest.TestCase):
+    """Local task search index"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = Cache(os.path.join(self.tmp.name, 'cache.sqlite'))
+        self.cache.open()
+        if not self.cache.fts:
+            self.skipTest('SQLite without FTS5')
+        self.server = {
+            1: task_data(1, name='Invoice export fails', description='<p>Customer cannot export</p>'),
+            2: task_data(2, name='Update logo', description='<p>New invoice layout needs logo</p>'),
+            3: task_data(3, name='Server upgrade', description='<p>Upgrade database server</p>'),
+        }
+        self.client = Mock(offline=False)
+        self.client.search = Mock(side_effect=lambda model, filters: sorted(self.server))
+        self.client.iter_search_read = Mock(side_effect=self.search_read)
+        self.client.read = Mock(side_effect=lambda model, ids, fields: [
+            {'id': i, 'date': '2018-10-21 12:00:00', 'body': '<p>Käyttäjä reported crash</p>'} for i in ids])
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def search_read(self, model, filters, fields=None):
+        since = [term[2] for term in filters if term[0] == 'write_date']
+        return [dict(task) for task in self.server.values() if not since or task['write_date'] >= since[0]]
+
+    def names(self, query, messages=False):
+        return [task.name for task in Task.search(self.client, query, self.cache, messages)]
+
+    def test_ranked_name_first(self):
+        """Name matches should rank above description matches"""
+        self.assertEqual(self.names('invoice'), ['Invoice export fails', 'Update logo'])
+
+    def test_prefix_and_terms(self):
+        """Terms match as prefixes and all terms must match"""
+        self.assertEqual(self.names('upgr'), ['Server upgrade'])
+        self.assertEqual(self.names('invoice logo'), ['Update logo'])
+        self.assertEqual(self.names('nothing'), [])
+
+    def test_incremental(self):
+        """Only changed tasks should be read and indexed again"""
+        Task.sync_index(self.client, self.cache)
+        self.server[3] = task_data(3, '2018-10-22 00:00:00', name='Server retired', description='<p></p>')
+        del self.server[2]
+        self.assertEqual(Task.sync_index(self.client, self.cache), 1)
+        self.assertEqual(self.names('server'), ['Server retired'])
+        self.assertEqual(self.names('logo'), [])
+        self.assertEqual(Task.sync_index(self.client, self.cache), 0)
+
+    def test_messages_and_local(self):
+        """Message bodies are indexed on request and search works offline"""
+        Task.sync_index(self.client, self.cache, messages=True)
+        self.client.reset_mock()
+        tasks = Task.search_local('kayttaja crash', self.cache)
+        self.assertEqual(len(tasks), 3)
+        self.client.search.assert_not_called()
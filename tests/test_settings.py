@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from odoohelper import settings
+from odoohelper.settings import Settings, get_config
+
+
+class SettingsCacheTestSuite(unittest.TestCase):
+    """Config should be parsed once per process"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'config.json')
+        with open(self.path, 'w') as f:
+            json.dump({'host': 'first'}, f)
+        self.env = patch.dict(os.environ, {'ODOO_CONFIG': self.path})
+        self.env.start()
+        settings._configs.clear()
+
+    def tearDown(self):
+        self.env.stop()
+        settings._configs.clear()
+        self.tmp.cleanup()
+
+    def test_parsed_once(self):
+        """Repeated Settings blocks should not parse file again"""
+        with patch('odoohelper.settings.json.load', wraps=json.load) as load:
+            for _ in range(10):
+                with Settings() as config:
+                    self.assertEqual(config['host'], 'first')
+            self.assertEqual(load.call_count, 1)
+
+    def test_mtime_invalidates(self):
+        """Changed file should be parsed again"""
+        self.assertEqual(get_config()['host'], 'first')
+        with open(self.path, 'w') as f:
+            json.dump({'host': 'second'}, f)
+        os.utime(self.path, ns=(0, 1))
+        with patch('odoohelper.settings.time.monotonic', return_value=10 ** 9):
+            self.assertEqual(get_config()['host'], 'second')
+
+    def test_save_updates_config(self):
+        """Saved values should be visible to next readers"""
+        with Settings() as config:
+            config['host'] = 'saved'
+            config.save()
+        self.assertEqual(get_config()['host'], 'saved')
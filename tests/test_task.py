@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import Mock
 from odoohelper.tasks import Task
 
 class TaskTestSuite(unittest.TestCase):
@@ -55,3 +56,50 @@ class TaskTestSuite(unittest.TestCase):
         self.assertIsNotNone(task)
         self.assertEqual(task.project, 'Not assigned to project')
 
+    def test_fetch_messages_batched(self):
+        """Messages for all tasks should be read with one call"""
+        client = Mock()
+        client.read = Mock(return_value=[
+            {'id': 11, 'date': '2018-10-21 12:00:00'},
+            {'id': 12, 'date': '2018-10-22 12:00:00'},
+            {'id': 21, 'date': '2018-10-23 12:00:00'},
+        ])
+        tasks_data = [
+            {'id': 1, 'message_ids': [11, 12]},
+            {'id': 2, 'message_ids': [21]},
+            {'id': 3, 'message_ids': []},
+        ]
+        Task.fetch_messages(client, tasks_data)
+        self.assertEqual(client.read.call_count, 1)
+        self.assertEqual([m['id'] for m in tasks_data[0]['partial_messages']], [11, 12])
+        self.assertEqual([m['id'] for m in tasks_data[1]['partial_messages']], [21])
+        self.assertEqual(tasks_data[2]['partial_messages'], [])
+
+    def test_flush_writes_once(self):
+        """Changed fields should be written with one call"""
+        client = Mock()
+        task = Task()
+        task.id = 1
+        task.set_deadline('2018-11-01')
+        self.assertTrue(task.flush(client))
+        client.write.assert_called_once_with(
+            'project.task', [1], {'date_deadline': '2018-11-01', 'date_end': '2018-11-01 22:00:00'},
+            write_dates={1: None})
+        self.assertFalse(task.flush(client))
+        self.assertEqual(client.write.call_count, 1)
+
+    def test_commit_groups_identical_changes(self):
+        """Tasks with identical changes should share one write"""
+        client = Mock()
+        tasks = []
+        for task_id in range(1, 6):
+            task = Task()
+            task.id = task_id
+            task.mark_done()
+            tasks.append(task)
+        tasks[4].set_value('name', 'other')
+        written = Task.commit(client, tasks)
+        self.assertEqual(len(written), 5)
+        self.assertEqual(client.write.call_count, 2)
+        self.assertEqual(client.write.call_args_list[0][0][1], [1, 2, 3, 4])
+        self.assertEqual(Task.commit(client, tasks), [])
@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 import unittest
 from unittest.mock import Mock
 from odoohelper.tasks import Task
+from odoohelper.tasks.priority import score_tasks
 
 class TaskPriorityTestSuite(unittest.TestCase):
     """Basic test cases."""
@@ -125,5 +126,28 @@ class TaskPriorityTestSuite(unittest.TestCase):
         })
         self.assertEqual(task_not_planned_end.priority_planned_hours_set(), 50)
 
+    def test_batch_scores_match(self):
+        """Batch scorer should give same priority as single task"""
+        now = datetime.strptime('2018-10-25 15:30:12', '%Y-%m-%d %H:%M:%S')
+        tasks = []
+        for index, deadline in enumerate([False, '2018-10-20', '2018-10-25', '2018-10-26',
+                                          '2018-10-29', '2018-11-10', '2019-10-31']):
+            task = Task({
+                'name': 'test',
+                'id': index,
+                'stage_id' : [1, 'name'],
+                'date_deadline': deadline,
+                'date_start': '2018-10-20 00:00:00' if index % 2 else False,
+                'date_end': '2018-10-31 23:59:00' if index % 3 else False,
+                'partial_messages': [{'date': f'2018-10-{10 + index} 16:00:00'}],
+                'kanban_state': 'blocked' if index % 2 else 'normal',
+                'planned_hours': index % 3,
+                'priority': str(index % 2)
+            })
+            task.get_current_time = Mock(return_value=now)
+            tasks.append(task)
+        expected = [task.calculate_priority() for task in tasks]
+        self.assertEqual([task.priority for task in score_tasks(tasks, now)], expected)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
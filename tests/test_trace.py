@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+import unittest
+
+from odoohelper import trace
+from odoohelper.client import Client
+
+
+class TraceTestSuite(unittest.TestCase):
+    """RPC tracing"""
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'trace.jsonl')
+        self.tracer = trace.start(self.path)
+        self.client = Client(username='user')
+
+    def tearDown(self):
+        trace.stop()
+        self.tmp.cleanup()
+
+    def test_calls_recorded(self):
+        """Each call should be recorded with model, method and count"""
+        self.client.rpc('project.task', 'read', lambda ids, fields: [{'id': i} for i in ids], [1, 2], ['id'])
+        self.client.rpc('project.task', 'write', lambda ids, vals: True, [1, 2, 3], {'name': 'x'})
+        records = self.tracer.records
+        self.assertEqual([(r.model, r.method, r.records) for r in records],
+                         [('project.task', 'read', 2), ('project.task', 'write', 3)])
+        self.assertTrue(all(r.request_bytes > 0 for r in records))
+        summary = self.tracer.summary()
+        self.assertIn('read', summary)
+        self.assertIn('total', summary)
+        trace.stop()
+        with open(self.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line['method'] for line in lines], ['read', 'write'])
+
+    def test_failed_call_recorded(self):
+        """Failing call should be recorded and raised"""
+        def fail():
+            raise ValueError('boom')
+        with self.assertRaises(ValueError):
+            self.client.rpc('res.users', 'search', fail)
+        self.assertEqual(self.tracer.records[0].error, 'boom')
+
+    def test_no_tracer(self):
+        """Without tracer calls should pass through"""
+        trace.stop()
+        self.assertEqual(self.client.rpc('res.users', 'search', lambda: [1]), [1])